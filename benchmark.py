@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the E-Paket downloader.
+Each subcommand measures one part of the pipeline against local, synthetic data so
+results are repeatable without touching the real server.
+
+    python benchmark.py transport --requests 2000 --concurrency 50
+    python benchmark.py listing --rows 200000
+    python benchmark.py parse --documents 2000 --threads 16
+    python benchmark.py startup --runs 5
+"""
+
+import argparse
+import gc
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from document_parser import extract_documents
+
+from package_filter import parse_listing_date, strip_html
+from package_listing import iter_listing_rows, parse_row
+from transport import create_transport, default_headers, http2_available
+
+
+# Synthetic E-Paket endpoints used by the transport benchmark
+_STUB_DOCUMENT = json.dumps({
+    "status": "success",
+    "data": '<div class="col-md-6"><table class="table-bordered"><tr><td>Jenis</td>'
+            '<td>AKTE KEMATIAN</td></tr></table><a href="_upload/DOKUMEN/x.pdf">PDF</a></div>'
+}).encode()
+_STUB_PDF = b"%PDF-1.4\n" + b"0" * 64 * 1024 + b"\n%%EOF\n"
+
+
+async def _stub_app(scope, receive, send):
+    """Minimal ASGI app serving dokumencetak POSTs and PDF GETs."""
+    if scope["type"] != "http":
+        return
+    while True:
+        message = await receive()
+        if not message.get("more_body"):
+            break
+    if scope["path"].endswith("/dokumencetak"):
+        body, content_type = _STUB_DOCUMENT, b"application/json"
+    else:
+        body, content_type = _STUB_PDF, b"application/pdf"
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _serve_stub(port):
+    """Serve the stub over cleartext HTTP/1.1 and HTTP/2 (needs hypercorn)."""
+    import asyncio
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.loglevel = "ERROR"
+    # hypercorn sends GOAWAY after 1000 requests per connection by default
+    config.keep_alive_max_requests = 10 ** 9
+    config.h2_max_concurrent_streams = 1000  # above the benchmark concurrency
+    # A never-completing shutdown trigger keeps hypercorn from installing signal handlers off the main thread
+    never = lambda: asyncio.get_running_loop().create_future()
+    threading.Thread(target=lambda: asyncio.run(serve(_stub_app, config, shutdown_trigger=never)),
+                     daemon=True).start()
+    time.sleep(1.0)
+
+
+def _run_transport(transport, base_url, total, concurrency):
+    """Alternate dokumencetak POSTs and PDF GETs, return (seconds, protocol)."""
+    versions = set()
+
+    def one(i):
+        if i % 2:
+            with transport.request("GET", f"{base_url}/_upload/DOKUMEN/{i}.pdf", stream=True) as response:
+                for _ in response.iter_bytes(8192):
+                    pass
+        else:
+            response = transport.request("POST", f"{base_url}/pengajuan/dokumencetak",
+                                         data={"kode_paket": str(i), "nomor": str(i), "nama": "x"})
+            response.json()
+        versions.add(response.http_version)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    return time.perf_counter() - start, ", ".join(sorted(versions))
+
+
+def bench_transport(args):
+    """Compare HTTP/1.1 and HTTP/2 transports at high concurrency."""
+    base_url = args.url
+    if not base_url:
+        base_url = f"http://127.0.0.1:{args.port}"
+        _serve_stub(args.port)
+
+    kinds = ["http1"]
+    if http2_available():
+        kinds.append("http2")
+    else:
+        print('httpx/h2 not installed, skipping HTTP/2 (pip install "httpx[http2]")')
+
+    for kind in kinds:
+        # Plain-http stubs only speak HTTP/2 with prior knowledge
+        transport = create_transport(kind, headers=default_headers(base_url), pool_size=args.concurrency,
+                                     prior_knowledge=base_url.startswith("http://"))
+        try:
+            _run_transport(transport, base_url, min(args.concurrency * 2, args.requests), args.concurrency)  # warm-up
+            seconds, versions = _run_transport(transport, base_url, args.requests, args.concurrency)
+        finally:
+            transport.close()
+        print(f"{kind:6} [{versions}] {args.requests} requests in {seconds:.2f}s "
+              f"= {args.requests / seconds:.0f} req/s")
+
+
+def _synthetic_listing(rows):
+    """Build a data_pengajuan_ajax payload shaped like the real listing."""
+    data = [
+        [i + 1,
+         f'<a href="pengajuan/lihat_paket/UEVULSR7aX0tMjU{i:08d}" target="_blank">PET-{i}-25</a>',
+         f"3201{i:012d}", f"NAMA PEMOHON {i}", f"0812{i:08d}",
+         '<span class="badge badge-success">Selesai</span>', f"{i % 28 + 1:02d}-{i % 12 + 1:02d}-2025"]
+        for i in range(rows)
+    ]
+    return json.dumps({"draw": 1, "recordsTotal": rows, "recordsFiltered": rows, "data": data}).encode()
+
+
+def _chunks(payload, size=64 * 1024):
+    view = memoryview(payload)
+    for offset in range(0, len(view), size):
+        yield bytes(view[offset:offset + size])
+
+
+def _listing_baseline(payload):
+    """Previous approach: whole-body json, raw rows kept, second list of dicts."""
+    rows = json.loads(payload).get("data", [])
+    packages = []
+    for row in rows:
+        match = re.search(r'href="pengajuan/lihat_paket/([^"]+)"[^>]*>([^<]+)</a>', row[1])
+        if match:
+            packages.append({"kode_paket": match.group(1), "nomor": match.group(2), "nama": row[3], "nik": row[2],
+                             "status": strip_html(row[5]), "tanggal": parse_listing_date(row[6])})
+    return rows, packages
+
+
+def _listing_streaming(payload):
+    """Current approach: incremental decode straight into PackageRecords."""
+    packages = []
+    for row in iter_listing_rows(_chunks(payload)):
+        package = parse_row(row)
+        if package:
+            packages.append(package)
+    return packages
+
+
+def bench_listing(args):
+    """Peak memory and time to turn a large listing into package records."""
+    payload = _synthetic_listing(args.rows)
+    print(f"Listing payload: {args.rows} rows, {len(payload) / (1024 * 1024):.1f} MB")
+
+    for name, func in (("baseline", _listing_baseline), ("streaming", _listing_streaming)):
+        # Time without tracemalloc, its per-allocation hook would distort the comparison
+        gc.collect()
+        start = time.perf_counter()
+        func(payload)
+        seconds = time.perf_counter() - start
+
+        gc.collect()
+        tracemalloc.start()
+        result = func(payload)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print(f"{name:9} {seconds:6.2f}s  peak {peak / (1024 * 1024):7.1f} MB  retained {current / (1024 * 1024):7.1f} MB")
+
+
+def _synthetic_document_html(sections=6, rows=12):
+    """dokumencetak HTML with several document sections, roughly real-world size."""
+    types = ["AKTE KEMATIAN", "AKTE KELAHIRAN", "KARTU KELUARGA", "SURAT PINDAH", "KTP", "LAINNYA"]
+    parts = ['<div class="row">']
+    for i in range(sections):
+        cells = "".join(f"<tr><td>Field {r}</td><td><span class='text-muted'>Value {r} for section {i}</span></td></tr>"
+                        for r in range(rows))
+        parts.append(
+            f'<div class="col-md-6"><div class="card"><div class="card-body">'
+            f'<table class="table table-bordered"><tr><td>Jenis</td><td>{types[i % len(types)]}</td></tr>{cells}</table>'
+            f'<a class="btn btn-primary" href="_upload/DOKUMEN/{i:06d}_DOC.pdf">Unduh</a></div></div></div>'
+        )
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def bench_parse(args):
+    """Parse throughput in worker threads vs a process pool, by process count."""
+    html = _synthetic_document_html()
+    documents = args.documents
+    print(f"Parsing {documents} responses of {len(html) / 1024:.0f} KB with {args.threads} worker threads")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(lambda _: extract_documents(html), range(documents)))
+    baseline = documents / (time.perf_counter() - start)
+    print(f"threads only        {baseline:8.0f} docs/s")
+
+    counts = sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+    for processes in [p for p in counts if p <= (os.cpu_count() or 1)]:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # Warm the pool so process start-up is not measured
+            list(pool.map(extract_documents, [html] * processes))
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                list(executor.map(lambda _: pool.submit(extract_documents, html).result(), range(documents)))
+            rate = documents / (time.perf_counter() - start)
+        print(f"{processes:2} processes        {rate:8.0f} docs/s  ({rate / baseline:.1f}x)")
+
+
+# Run in a fresh interpreter per measurement so nothing is already imported
+_STARTUP_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import gui_bulk_download
+result = {"import": time.perf_counter() - start, "engine_loaded": "requests" in sys.modules}
+try:
+    import tkinter as tk
+    root = tk.Tk()
+    app = gui_bulk_download.EPGUIApplication(root)
+    root.update()
+    result["first_frame"] = time.perf_counter() - start
+    root.destroy()
+except tk.TclError:
+    result["first_frame"] = None
+start = time.perf_counter()
+import session_validator, enhanced_downloader
+result["engine"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def bench_startup(args):
+    """GUI import and first-frame time, and the engine import cost that is deferred."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=here, capture_output=True,
+                                text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Median of {args.runs} fresh interpreters")
+    print(f"import gui_bulk_download     {statistics.median(r['import'] for r in runs) * 1000:7.1f} ms"
+          f"  (engine loaded at import: {runs[0]['engine_loaded']})")
+    frames = [r["first_frame"] for r in runs if r["first_frame"] is not None]
+    if frames:
+        print(f"first frame drawn            {statistics.median(frames) * 1000:7.1f} ms")
+    else:
+        print("first frame drawn                n/a  (no display)")
+    print(f"engine imports (background) {statistics.median(r['engine'] for r in runs) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-Paket downloader benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    transport_parser = subparsers.add_parser("transport", help="HTTP/1.1 vs HTTP/2 request throughput")
+    transport_parser.add_argument("--url", help="Base URL of an existing stub (default: start a local hypercorn stub)")
+    transport_parser.add_argument("--port", type=int, default=8790)
+    transport_parser.add_argument("--requests", type=int, default=2000)
+    transport_parser.add_argument("--concurrency", type=int, default=50)
+    transport_parser.set_defaults(func=bench_transport)
+
+    listing_parser = subparsers.add_parser("listing", help="Memory use of decoding a large package listing")
+    listing_parser.add_argument("--rows", type=int, default=200000)
+    listing_parser.set_defaults(func=bench_listing)
+
+    parse_parser = subparsers.add_parser("parse", help="HTML parse throughput, threads vs process pool")
+    parse_parser.add_argument("--documents", type=int, default=2000)
+    parse_parser.add_argument("--threads", type=int, default=16)
+    parse_parser.set_defaults(func=bench_parse)
+
+    startup_parser = subparsers.add_parser("startup", help="GUI import and first-frame time")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+E-Paket Bulk Download - Command Line
+====================================
+
+Command line front-end for the enhanced downloader, for scheduled and unattended runs.
+
+    python cli_bulk_download.py download --types "AKTE KEMATIAN"
+    python cli_bulk_download.py plan --types "AKTE KEMATIAN" "KARTU KELUARGA" --plan plan.sqlite
+    python cli_bulk_download.py execute --plan plan.sqlite --start 0 --limit 5000
+    python cli_bulk_download.py verify --output-dir . --repair
+    python cli_bulk_download.py search 3201000000000003
+    python cli_bulk_download.py download --types "KARTU KELUARGA" --scan-cache scan_cache.sqlite --scan-mode cache-only
+    python cli_bulk_download.py download --types "AKTE KEMATIAN" --max-minutes 120
+    python cli_bulk_download.py download --types "AKTE KEMATIAN" --shard 1/4 --max-rps 20
+    python cli_bulk_download.py merge --inputs host1 host2 host3 host4 --output-dir merged
+    python cli_bulk_download.py batch --jobs jobs.json
+    python cli_bulk_download.py watch --types "AKTE KEMATIAN" --min-interval 5 --max-interval 120
+
+The session cookie is read from --cookie, the EPAKET_SESSION environment variable,
+or prompted for.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from document_index import DOCUMENT_INDEX_NAME, DocumentIndex
+from download_jobs import DownloadJob
+from enhanced_downloader import EnhancedDownloader
+from integrity import load_manifests, verify_downloads
+from latency import LatencyTracker
+from output_backends import ArchiveOutput, FolderOutput
+from package_filter import PackageFilter
+from run_budget import RunBudget
+from scan_cache import ScanCache
+from sharding import Shard, merge_shards, write_shard_summary
+from watch_mode import AdaptiveInterval, Watcher
+
+# Same document types the GUI offers
+DOCUMENT_TYPES = ["AKTE KEMATIAN", "AKTE KELAHIRAN", "KARTU KELUARGA"]
+
+
+def print_progress(current, total, percentage, message):
+    print(f"Progress: {current}/{total} ({percentage:.1f}%) - {message}")
+
+
+def print_status(message, level):
+    print(f"[{level.upper()}] {message}")
+
+
+def normalize_document_types(values):
+    """Accept "AKTE KEMATIAN", "AKTE_KEMATIAN" or "akte_kematian"."""
+    types = []
+    for value in values:
+        name = value.replace("_", " ").upper().strip()
+        if name not in DOCUMENT_TYPES:
+            raise argparse.ArgumentTypeError(f"Unknown document type: {value} (choose from {', '.join(DOCUMENT_TYPES)})")
+        types.append(name)
+    return types
+
+
+def get_session_cookie(args):
+    """Session cookie from arguments, environment or prompt."""
+    cookie = args.cookie or os.environ.get("EPAKET_SESSION", "")
+    if not cookie:
+        cookie = input("Enter session cookie: ")
+    return cookie.strip()
+
+
+def get_shard(args):
+    return Shard.parse(args.shard) if args.shard else None
+
+
+def prompt_new_cookie():
+    """Session renewal callback: ask on the terminal, give up when running unattended."""
+    if not sys.stdin or not sys.stdin.isatty():
+        return None
+    return input("Session expired - enter a new session cookie (empty to stop): ").strip() or None
+
+
+def build_output(args):
+    """Folder output by default, archive shards with --archive."""
+    if args.archive:
+        # Work shards sharing one output folder must not write to the same archive names
+        shard = get_shard(args)
+        prefix = f"epaket_{shard.label}" if shard else "epaket"
+        return ArchiveOutput(args.output_dir, fmt=args.archive, max_bytes=args.shard_mb * 1024 * 1024,
+                             max_files=args.shard_files, prefix=prefix)
+    return FolderOutput(args.output_dir)
+
+
+def build_downloader(args):
+    kwargs = {"max_workers": args.workers, "transport": args.transport, "parse_processes": args.parse_processes,
+              "trace_path": args.trace, "shard": get_shard(args), "max_rps": args.max_rps,
+              "rate_share": args.rate_share,
+              "defer_stragglers": not args.no_defer, "latency": LatencyTracker(factor=args.straggler_factor),
+              "h2_prior_knowledge": args.h2_prior_knowledge}
+    if args.base_url:
+        kwargs["base_url"] = args.base_url
+    if args.scan_cache:
+        kwargs["scan_cache"] = ScanCache(args.scan_cache, max_bytes=args.cache_mb * 1024 * 1024,
+                                         ttl=args.cache_days * 24 * 3600 if args.cache_days else None)
+        kwargs["scan_mode"] = args.scan_mode
+    if hasattr(args, "archive"):
+        kwargs["output"] = build_output(args)
+        kwargs["dedup"] = not args.no_dedup
+        if not args.no_index:
+            kwargs["document_index"] = os.path.join(args.output_dir, DOCUMENT_INDEX_NAME)
+    elif hasattr(args, "output_dir"):
+        # verify --repair puts fresh copies back into the folder it checked
+        kwargs["output"] = FolderOutput(args.output_dir)
+    if hasattr(args, "max_minutes"):
+        kwargs["budget"] = RunBudget(
+            args.max_minutes * 60 if args.max_minutes else None,
+            args.max_mb * 1024 * 1024 if args.max_mb else None,
+            args.max_requests or None)
+        kwargs["checkpoint"] = args.checkpoint
+    downloader = EnhancedDownloader(**kwargs)
+    if getattr(args, "fresh", False) and os.path.exists(downloader.checkpoint_path):
+        os.remove(downloader.checkpoint_path)
+        print(f"Removed checkpoint {downloader.checkpoint_path}")
+    downloader.set_callbacks(print_progress if args.progress else None, print_status,
+                             session_callback=prompt_new_cookie)
+    return downloader
+
+
+def build_filter(args):
+    return PackageFilter.from_text(args.date_from, args.date_to, args.status, " ".join(args.ids))
+
+
+def load_jobs(path, shard=None):
+    """Read a batch from a JSON list of jobs.
+
+    Each job has "name", "types" and "output_dir", and optionally "date_from",
+    "date_to", "status", "ids", "archive" ("zip"/"tar") and "index" (false to
+    skip the search index).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        specs = json.load(f)
+    if isinstance(specs, dict):
+        specs = specs.get("jobs", [])
+    jobs = []
+    for number, spec in enumerate(specs, 1):
+        name = spec.get("name") or f"job{number}"
+        types = normalize_document_types(spec.get("types") or [])
+        ids = spec.get("ids", "")
+        package_filter = PackageFilter.from_text(spec.get("date_from", ""), spec.get("date_to", ""),
+                                                 spec.get("status", ""), " ".join(ids) if isinstance(ids, list) else ids)
+        output_dir = spec.get("output_dir") or name
+        if spec.get("archive"):
+            prefix = f"epaket_{shard.label}" if shard else "epaket"
+            output = ArchiveOutput(output_dir, fmt=spec["archive"], prefix=prefix)
+        else:
+            output = FolderOutput(output_dir)
+        jobs.append(DownloadJob(name, types, package_filter, output, index_documents=spec.get("index", True)))
+    return jobs
+
+
+def add_common_arguments(parser):
+    parser.add_argument("--cookie", help="ci_session cookie (default: $EPAKET_SESSION or prompt)")
+    parser.add_argument("--base-url", help="E-Paket server base URL")
+    parser.add_argument("--workers", type=int, default=5, help="Concurrent workers (default: 5)")
+    parser.add_argument("--transport", choices=["http1", "http2", "auto"], default="http1")
+    parser.add_argument("--h2-prior-knowledge", action="store_true",
+                        help="Speak HTTP/2 to a plain http:// base URL without negotiation (h2c)")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="Parse responses in this many processes (default: 0, parse in worker threads)")
+    parser.add_argument("--trace", help="Write a Chrome trace-event / Perfetto timeline of the run to this file")
+    parser.add_argument("--progress", action="store_true", help="Print a progress line per package")
+    parser.add_argument("--scan-cache", help="Keep dokumencetak responses in this cache file (e.g. scan_cache.sqlite)")
+    parser.add_argument("--scan-mode", choices=["auto", "refresh", "cache-only"], default="auto",
+                        help="auto: POST only on a cache miss, refresh: always POST, cache-only: never POST")
+    parser.add_argument("--cache-mb", type=int, default=512, help="Scan cache size limit in MB (default: 512)")
+    parser.add_argument("--cache-days", type=float, default=30, help="Days a cached scan stays valid (0 = forever)")
+    parser.add_argument("--shard", help="Only process shard i of N (e.g. 1/4), split by a stable hash of kode_paket")
+    parser.add_argument("--max-rps", type=float,
+                        help="Overall request budget in requests/second; each of N shards uses 1/N of it")
+    parser.add_argument("--rate-share", type=float,
+                        help="Fraction of --max-rps this shard uses instead of 1/N (e.g. 0.4 on a faster host)")
+    parser.add_argument("--straggler-factor", type=float, default=3.0,
+                        help="Requests slower than this many times the endpoint's recent p95 are retried at the end")
+    parser.add_argument("--no-defer", action="store_true", help="Wait for slow requests instead of deferring them")
+
+
+def add_output_arguments(parser):
+    parser.add_argument("--output-dir", default=".", help="Where the {TYPE}_Downloads folders or shards go")
+    parser.add_argument("--archive", choices=["zip", "tar"], help="Stream documents into archive shards")
+    parser.add_argument("--shard-mb", type=int, default=1024, help="Archive shard size cap in MB")
+    parser.add_argument("--shard-files", type=int, default=10000, help="Archive shard file count cap")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Store identical PDFs separately instead of linking them to the first copy")
+    parser.add_argument("--no-index", action="store_true", help="Do not update the document search index")
+
+
+def add_budget_arguments(parser):
+    parser.add_argument("--max-minutes", type=float, help="Stop starting new packages after this many minutes")
+    parser.add_argument("--max-mb", type=float, help="Stop starting new packages after downloading this many MB")
+    parser.add_argument("--max-requests", type=int, help="Stop starting new packages after this many requests")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Record finished packages so a run cut short by a limit resumes where it stopped")
+    parser.add_argument("--fresh", action="store_true", help="Remove the checkpoint of an earlier run and start over")
+
+
+def add_filter_arguments(parser):
+    parser.add_argument("--types", nargs="+", required=True, help="Document types, e.g. \"AKTE KEMATIAN\"")
+    parser.add_argument("--date-from", default="", help="Only packages submitted on/after this date (DD-MM-YYYY)")
+    parser.add_argument("--date-to", default="", help="Only packages submitted on/before this date (DD-MM-YYYY)")
+    parser.add_argument("--status", default="", help="Comma-separated package status values")
+    parser.add_argument("--ids", nargs="*", default=[], help="Only these NIKs / package numbers")
+
+
+def save_shard_summary(args, result):
+    """Leave the shard's result in its output folder for the merge command."""
+    shard = get_shard(args)
+    if shard:
+        path = write_shard_summary(args.output_dir, shard, result)
+        print(f"Shard {shard} summary written to {path}")
+    return result
+
+
+def cmd_download(args):
+    downloader = build_downloader(args)
+    result = downloader.bulk_download(normalize_document_types(args.types), get_session_cookie(args), build_filter(args))
+    return save_shard_summary(args, result)
+
+
+def cmd_batch(args):
+    jobs = load_jobs(args.jobs, get_shard(args))
+    downloader = build_downloader(args)
+    return downloader.download_jobs(jobs, get_session_cookie(args))
+
+
+def cmd_watch(args):
+    downloader = build_downloader(args)
+    interval = AdaptiveInterval(args.min_interval, args.max_interval, args.backoff)
+    watcher = Watcher(downloader, normalize_document_types(args.types), get_session_cookie(args), build_filter(args),
+                      interval, max_polls=args.max_polls)
+    try:
+        return watcher.run()
+    except KeyboardInterrupt:
+        # State and output were closed by run(); a stop is the normal way to end a watch
+        print("[WARNING] Watch interrupted")
+        return {"success": True, "polls": watcher.polls}
+
+
+def cmd_plan(args):
+    downloader = build_downloader(args)
+    return downloader.plan_download(normalize_document_types(args.types), get_session_cookie(args), args.plan,
+                                    build_filter(args), fetch_sizes=not args.no_sizes)
+
+
+def cmd_execute(args):
+    downloader = build_downloader(args)
+    types = normalize_document_types(args.types) if args.types else None
+    result = downloader.execute_plan(args.plan, get_session_cookie(args), types, args.start, args.limit)
+    return save_shard_summary(args, result)
+
+
+def cmd_verify(args):
+    progress = None
+    if args.progress:
+        progress = lambda current, total, name: print(f"Verified: {current}/{total} - {name}")
+    report = verify_downloads(args.output_dir, args.verify_workers, progress)
+
+    print(f"Checked {report['checked']} files: {report['ok']} ok, {len(report['bad'])} bad, "
+          f"{len(report['partials'])} partial downloads left over")
+    for bad in report["bad"]:
+        if bad.get("archive"):
+            source = "archive member"
+        else:
+            source = "re-downloadable" if bad["url"] else "not in manifest"
+        print(f"[BAD] {bad['path']}: {bad['problem']} ({source})")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+    if not args.repair:
+        return {"success": not report["bad"] and not report["partials"], "checked": report["checked"],
+                "bad": len(report["bad"]), "partials": len(report["partials"])}
+    if not report["bad"] and not report["partials"]:
+        return {"success": True, "checked": report["checked"], "bad": 0}
+
+    downloader = build_downloader(args)
+    return downloader.repair_downloads(report, get_session_cookie(args))
+
+
+def cmd_search(args):
+    index_path = os.path.join(args.output_dir, DOCUMENT_INDEX_NAME)
+    rebuild = args.rebuild or not os.path.exists(index_path)
+    index = DocumentIndex(index_path)
+    if rebuild:
+        entries = load_manifests(args.output_dir).values()
+        print(f"Indexed {index.rebuild(entries)} documents from the download manifests")
+    if not args.query:
+        return {"success": True, "documents": index.count()}
+
+    start = time.perf_counter()
+    document_type = normalize_document_types([args.type])[0] if args.type else None
+    results = index.search(" ".join(args.query), document_type, args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for result in results:
+        print(f"{result['nomor'] or '-':<16} {result['nik'] or '-':<18} {result['nama'] or '-':<30} "
+              f"{result['document_type']:<16} {result['path'] or result['location']}")
+    print(f"{len(results)} documents found in {elapsed:.1f} ms ({index.count()} indexed)")
+    return {"success": True, "found": len(results)}
+
+
+def cmd_merge(args):
+    report = merge_shards(args.inputs, args.output_dir)
+    print(f"Merged {len(report['shards'])} shard summaries: {report['downloaded']} downloaded, "
+          f"{report['skipped']} skipped, {report['errors']} errors, {report['total_packages']} packages, "
+          f"{report['documents']} documents in the merged manifest")
+    if report["missing_shards"]:
+        print(f"[WARNING] Missing shards: {', '.join(report['missing_shards'])}")
+    if report.get("error"):
+        print(f"[ERROR] {report['error']}")
+    return {key: report[key] for key in ("success", "downloaded", "skipped", "errors", "total_packages", "documents")}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="E-Paket bulk download (command line)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    download_parser = subparsers.add_parser("download", help="Scan and download in one pass")
+    add_common_arguments(download_parser)
+    add_output_arguments(download_parser)
+    add_filter_arguments(download_parser)
+    add_budget_arguments(download_parser)
+    download_parser.set_defaults(func=cmd_download)
+
+    batch_parser = subparsers.add_parser("batch", help="Run several download jobs with one listing fetch and scan")
+    add_common_arguments(batch_parser)
+    add_budget_arguments(batch_parser)
+    batch_parser.add_argument("--jobs", required=True,
+                              help="JSON list of jobs: name, types, output_dir and optional filter fields")
+    batch_parser.set_defaults(func=cmd_batch)
+
+    watch_parser = subparsers.add_parser("watch", help="Keep polling and download new documents as they appear")
+    add_common_arguments(watch_parser)
+    add_output_arguments(watch_parser)
+    add_filter_arguments(watch_parser)
+    watch_parser.add_argument("--min-interval", type=float, default=5, help="Seconds between polls while busy")
+    watch_parser.add_argument("--max-interval", type=float, default=120, help="Longest wait between idle polls")
+    watch_parser.add_argument("--backoff", type=float, default=1.5,
+                              help="Factor the interval grows by after each poll without new packages")
+    watch_parser.add_argument("--max-polls", type=int, help="Stop after this many polls (default: run until stopped)")
+    watch_parser.set_defaults(func=cmd_watch)
+
+    plan_parser = subparsers.add_parser("plan", help="Scan only and write a document index")
+    add_common_arguments(plan_parser)
+    add_filter_arguments(plan_parser)
+    plan_parser.add_argument("--plan", required=True, help="Index file (.csv, .sqlite or .parquet)")
+    plan_parser.add_argument("--no-sizes", action="store_true", help="Skip HEAD requests for file sizes")
+    plan_parser.set_defaults(func=cmd_plan)
+
+    execute_parser = subparsers.add_parser("execute", help="Download the documents listed in a plan")
+    add_common_arguments(execute_parser)
+    add_output_arguments(execute_parser)
+    add_budget_arguments(execute_parser)
+    execute_parser.add_argument("--plan", required=True, help="Index file written by the plan command")
+    execute_parser.add_argument("--types", nargs="+", help="Only these document types from the plan")
+    execute_parser.add_argument("--start", type=int, default=0, help="First plan row to download")
+    execute_parser.add_argument("--limit", type=int, help="Number of plan rows to download")
+    execute_parser.set_defaults(func=cmd_execute)
+
+    verify_parser = subparsers.add_parser("verify", help="Check saved PDFs and optionally re-download bad ones")
+    add_common_arguments(verify_parser)
+    verify_parser.add_argument("--output-dir", default=".", help="Folder holding the {TYPE}_Downloads folders")
+    verify_parser.add_argument("--verify-workers", type=int, default=8, help="Files checked in parallel")
+    verify_parser.add_argument("--report", help="Write the full report (incl. checksums) as JSON")
+    verify_parser.add_argument("--repair", action="store_true", help="Quarantine bad files and re-download them")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    search_parser = subparsers.add_parser("search", help="Find saved documents by NIK, name or package number")
+    search_parser.add_argument("query", nargs="*", help="Search terms (prefixes match, all terms must match)")
+    search_parser.add_argument("--output-dir", default=".", help="Folder holding the downloads and the index")
+    search_parser.add_argument("--type", help="Only this document type")
+    search_parser.add_argument("--limit", type=int, default=50, help="Maximum results (default: 50)")
+    search_parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the download manifest")
+    search_parser.set_defaults(func=cmd_search)
+
+    merge_parser = subparsers.add_parser("merge", help="Combine the manifests and summaries of shard runs")
+    merge_parser.add_argument("--inputs", nargs="+", required=True, help="Output folders of the shard runs")
+    merge_parser.add_argument("--output-dir", default=".", help="Where the merged manifest and run_report.json go")
+    merge_parser.set_defaults(func=cmd_merge)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    try:
+        result = args.func(args)
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        print(f"[ERROR] {e}")
+        return 2
+    except KeyboardInterrupt:
+        print("[WARNING] Interrupted")
+        return 130
+
+    print(f"Result: {result}")
+    return 0 if result.get("success") else 1
+
+
+if __name__ == "__main__":
+    # Needed for the parse process pool in frozen Windows builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Local search index of downloaded documents.
+Maps NIK, name, package number and document type to where each document was saved, in
+a SQLite database with an FTS5 full-text table. The downloader adds every document as it
+lands; rebuild() backfills the index from the download manifest.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+DOCUMENT_INDEX_NAME = "document_index.sqlite"
+
+_COLUMNS = ("location", "document_type", "filename", "nomor", "nama", "nik", "kode_paket", "size", "sha256", "saved")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    location TEXT UNIQUE NOT NULL,
+    document_type TEXT,
+    filename TEXT,
+    nomor TEXT,
+    nama TEXT,
+    nik TEXT,
+    kode_paket TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    saved TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_nik ON documents (nik);
+CREATE INDEX IF NOT EXISTS documents_nomor ON documents (nomor);
+"""
+
+# External-content FTS table kept in sync with documents by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    nik, nama, nomor, document_type, filename, content='documents', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, nik, nama, nomor, document_type, filename)
+    VALUES (new.id, new.nik, new.nama, new.nomor, new.document_type, new.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, nik, nama, nomor, document_type, filename)
+    VALUES ('delete', old.id, old.nik, old.nama, old.nomor, old.document_type, old.filename);
+END;
+"""
+
+
+_INSERT = f"INSERT INTO documents ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+def _fts_query(text):
+    """Every whitespace-separated term must match, each as a quoted prefix phrase.
+
+    "PET-00003" becomes "PET-00003"*, which the tokenizer matches as the
+    token sequence pet 00003*.
+    """
+    terms = text.split()
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+class DocumentIndex:
+    """SQLite index of saved documents, searchable by NIK, name, package number and type."""
+
+    def __init__(self, path=DOCUMENT_INDEX_NAME, root=None):
+        self.path = path
+        # Folder the manifest locations are relative to (default: the index's folder)
+        self.root = root if root is not None else (os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        # A first run into a new output folder opens the index before any document is saved
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: fall back to LIKE queries
+            self.fts = False
+        self._db.commit()
+
+    @staticmethod
+    def _values(entry):
+        values = [entry.get(column) for column in _COLUMNS]
+        if values[-1] is None:
+            values[-1] = time.strftime("%Y-%m-%d %H:%M:%S")
+        return values
+
+    def add(self, entry):
+        """Index one saved document (a download manifest entry)."""
+        with self._lock:
+            # Delete + insert (not INSERT OR REPLACE) so the FTS delete trigger fires
+            self._db.execute("DELETE FROM documents WHERE location = ?", (entry["location"],))
+            self._db.execute(_INSERT, self._values(entry))
+            self._db.commit()
+
+    def rebuild(self, manifest_entries):
+        """Replace the index contents with the given manifest entries (latest per location)."""
+        with self._lock:
+            self._db.execute("DELETE FROM documents")
+            if self.fts:
+                self._db.execute("INSERT INTO documents_fts (documents_fts) VALUES ('delete-all')")
+            self._db.executemany(_INSERT, (self._values(entry) for entry in manifest_entries))
+            self._db.commit()
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(self, text, document_type=None, limit=100):
+        """Documents matching every term of text (prefix match), most recently indexed first."""
+        text = text.strip()
+        if not text:
+            return []
+        if self.fts:
+            query = _fts_query(text)
+            if document_type:
+                query += ' document_type:"' + document_type.replace('"', '""') + '"'
+            # FTS5 walks its matches newest (highest rowid) first and stops at the limit
+            sql = ("SELECT * FROM documents WHERE id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? "
+                   "ORDER BY rowid DESC LIMIT ?)")
+            params = [query, limit]
+        else:
+            sql = "SELECT * FROM documents WHERE 1"
+            params = []
+            for term in text.split():
+                sql += " AND (nik LIKE ? OR nama LIKE ? OR nomor LIKE ? OR document_type LIKE ? OR filename LIKE ?)"
+                params.extend([f"%{term}%"] * 5)
+        if document_type:
+            sql += " AND document_type = ?"
+            params.append(document_type)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            result.pop("id", None)
+            # Archive locations ("shard:member") are not plain paths
+            result["path"] = None if ":" in row["location"] else os.path.join(self.root, row["location"])
+            results.append(result)
+        return results
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
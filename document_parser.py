@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Parsing of dokumencetak responses.
+Kept free of network code so the same extraction can run on live responses,
+cached responses or in worker processes.
+"""
+
+import re
+from bs4 import BeautifulSoup
+
+_DOCUMENT_LINK_RE = re.compile(r'_upload/DOKUMEN')
+
+
+def extract_documents(html):
+    """Extract (document type, download href) pairs from a dokumencetak HTML fragment.
+
+    Documents are returned in page order. Types without a download link are skipped.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    documents = []
+
+    # Find all document sections (each has a table with document info)
+    for table in soup.find_all('table', class_='table-bordered'):
+        jenis = None
+
+        # Look for the "Jenis" row
+        for row in table.find_all('tr'):
+            cells = row.find_all('td')
+            if len(cells) >= 2 and cells[0].get_text(strip=True) == "Jenis":
+                jenis = cells[1].get_text(strip=True)
+                break
+
+        if not jenis:
+            continue
+
+        # The download link sits in the parent column next to the table
+        parent = table.find_parent('div', class_='col-md-6')
+        if parent:
+            download_link = parent.find('a', href=_DOCUMENT_LINK_RE)
+            if download_link and download_link.get('href'):
+                documents.append((jenis, download_link.get('href')))
+
+    return documents
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Batched download jobs.
+Several jobs, each with its own document types, package filter and output, run as one
+execution (EnhancedDownloader.download_jobs): the listing is fetched once, every package
+is scanned once for all jobs, and each document is fetched once and saved to every job
+that wants it.
+"""
+
+import os
+
+from document_index import DOCUMENT_INDEX_NAME, DocumentIndex
+from integrity import ContentIndex, DownloadManifest, MANIFEST_NAME
+from output_backends import FolderOutput
+
+
+class DownloadJob:
+    """Document types, optional PackageFilter and output of one job in a batch.
+
+    Carries the same output, manifest, content_index and document_index
+    attributes the downloader keeps for its own output, so a document can be
+    saved to a job exactly the way a single run saves it.
+    """
+
+    def __init__(self, name, document_types, package_filter=None, output=None, index_documents=True):
+        self.name = name
+        self.document_types = list(document_types)
+        if package_filter is not None and not package_filter.is_active():
+            package_filter = None
+        self.package_filter = package_filter
+        self.output = output if output is not None else FolderOutput(name)
+        self.index_documents = index_documents
+        self.manifest = None
+        self.content_index = None
+        self.document_index = None
+        self.counts = {}
+
+    def wants(self, package):
+        """Check whether the job's filter selects a package."""
+        return self.package_filter is None or self.package_filter.matches(package)
+
+    def describe(self):
+        filter_text = self.package_filter.describe() if self.package_filter is not None else ""
+        return [self.name, sorted(self.document_types), filter_text, os.path.abspath(self.output.root)]
+
+    def prepare(self, manifest_name=MANIFEST_NAME, dedup=True):
+        """Open the job's manifest and indexes for a run and reset its counters."""
+        os.makedirs(self.output.root, exist_ok=True)
+        self.manifest = DownloadManifest(os.path.join(self.output.root, manifest_name))
+        self.content_index = ContentIndex.from_manifest(self.manifest) if dedup else None
+        if self.index_documents and self.document_index is None:
+            self.document_index = DocumentIndex(os.path.join(self.output.root, DOCUMENT_INDEX_NAME),
+                                                root=self.output.root)
+        self.counts = {"packages": 0, "downloaded": 0, "skipped": 0, "errors": 0}
+
+    def close(self):
+        """Finalize the job's output (archive shards) and close its index."""
+        try:
+            self.output.close()
+        finally:
+            if self.document_index is not None:
+                self.document_index.close()
+                self.document_index = None
+
+    def result(self):
+        return dict(self.counts, output=self.output.root, document_types=self.document_types)
+
+
+def check_jobs(jobs):
+    """Reject batches a single execution cannot keep apart."""
+    if not jobs:
+        raise ValueError("No jobs to run")
+    names = set()
+    roots = {}
+    for job in jobs:
+        if job.name in names:
+            raise ValueError(f"Duplicate job name: {job.name}")
+        names.add(job.name)
+        if not job.document_types:
+            raise ValueError(f"Job {job.name} has no document types")
+        # Two jobs in one folder would race for the same files and manifest
+        root = os.path.abspath(job.output.root)
+        if root in roots:
+            raise ValueError(f"Jobs {roots[root]} and {job.name} share the output folder {job.output.root}")
+        roots[root] = job.name
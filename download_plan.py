@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Document index ("plan") written by the scan-only planning mode and consumed by execute mode.
+Supported formats are picked from the file extension: .csv, .sqlite/.db and .parquet
+(Parquet needs the optional pyarrow package).
+"""
+
+import os
+import csv
+import sqlite3
+import threading
+
+PLAN_COLUMNS = ["nomor", "nama", "nik", "kode_paket", "document_type", "pdf_url", "filename", "size"]
+
+
+def plan_format(path):
+    """Get the plan format for a file path."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".sqlite", ".sqlite3", ".db"):
+        return "sqlite"
+    if ext == ".parquet":
+        return "parquet"
+    raise ValueError(f"Unsupported plan format: {ext or path} (use .csv, .sqlite or .parquet)")
+
+
+class PlanWriter:
+    """Thread-safe, incremental writer for a plan index.
+
+    CSV and SQLite rows are written as they arrive, so an interrupted plan still
+    holds everything scanned so far. Parquet is columnar and written on close.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = plan_format(path)
+        self.rows_written = 0
+        self._lock = threading.Lock()
+        self._rows = []
+
+        if os.path.exists(path):
+            os.remove(path)
+
+        if self.format == "csv":
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=PLAN_COLUMNS)
+            self._writer.writeheader()
+        elif self.format == "sqlite":
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE plan (nomor TEXT, nama TEXT, nik TEXT, kode_paket TEXT, "
+                "document_type TEXT, pdf_url TEXT, filename TEXT, size INTEGER)"
+            )
+        elif self.format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("Parquet plans need pyarrow: pip install pyarrow") from e
+
+    def add(self, row):
+        """Append one document row (dict with PLAN_COLUMNS keys)."""
+        with self._lock:
+            if self.format == "csv":
+                self._writer.writerow({column: row.get(column) for column in PLAN_COLUMNS})
+                self._file.flush()
+            elif self.format == "sqlite":
+                self._db.execute("INSERT INTO plan VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [row.get(column) for column in PLAN_COLUMNS])
+                # Commit in batches, a commit per row would dominate planning time
+                if self.rows_written % 500 == 0:
+                    self._db.commit()
+            else:
+                self._rows.append({column: row.get(column) for column in PLAN_COLUMNS})
+            self.rows_written += 1
+
+    def close(self):
+        """Flush and close the plan file."""
+        with self._lock:
+            if self.format == "csv":
+                self._file.close()
+            elif self.format == "sqlite":
+                self._db.commit()
+                self._db.close()
+            else:
+                import pyarrow
+                import pyarrow.parquet
+                table = pyarrow.Table.from_pylist(self._rows, schema=pyarrow.schema(
+                    [(column, pyarrow.int64() if column == "size" else pyarrow.string()) for column in PLAN_COLUMNS]
+                ))
+                pyarrow.parquet.write_table(table, self.path)
+                self._rows = []
+
+
+def read_plan(path):
+    """Read all rows of a plan index as dicts."""
+    fmt = plan_format(path)
+    if fmt == "csv":
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["size"] = int(row["size"]) if row.get("size") else None
+        return rows
+    if fmt == "sqlite":
+        db = sqlite3.connect(path)
+        try:
+            cursor = db.execute(f"SELECT {', '.join(PLAN_COLUMNS)} FROM plan ORDER BY rowid")
+            return [dict(zip(PLAN_COLUMNS, values)) for values in cursor]
+        finally:
+            db.close()
+    import pyarrow.parquet
+    return pyarrow.parquet.read_table(path).to_pylist()
+
+
+def summarize_plan(rows):
+    """Count documents and known bytes per document type."""
+    summary = {}
+    for row in rows:
+        entry = summary.setdefault(row["document_type"], {"documents": 0, "bytes": 0, "unknown_size": 0})
+        entry["documents"] += 1
+        if row.get("size") is None:
+            entry["unknown_size"] += 1
+        else:
+            entry["bytes"] += row["size"]
+    return summary
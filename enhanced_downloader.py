@@ -5,27 +5,109 @@ Uses ThreadPoolExecutor for concurrent downloads with configurable worker count.
 """
 
 import os
-import re
+import sys
 import json
-import requests
+import queue
+import asyncio
+import itertools
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from document_index import DocumentIndex
+from document_parser import extract_documents
+from download_jobs import check_jobs
+from download_plan import PlanWriter, read_plan, summarize_plan
+from integrity import ContentIndex, DownloadManifest, MANIFEST_NAME, quarantine
+from latency import LatencyTracker, Straggler
+from output_backends import FolderOutput
+from package_listing import iter_listing_rows, parse_row
+from run_stats import RunStats, StatsTicker
+from run_budget import CHECKPOINT_NAME, RunCheckpoint
+from run_trace import TraceRecorder, TracedLock
+from scan_cache import ScanCache
+from session_validator import SessionExpired, login_page_chunk, session_lost
+from sharding import RequestBudget
+from transport import RequestTimedOut, create_transport, default_headers
+from watch_mode import package_fingerprint
+
+# Returned by _span when tracing is off: entering it costs next to nothing
+_NO_SPAN = contextlib.nullcontext()
 
 class EnhancedDownloader:
-    def __init__(self, base_url="http://real-base-url-is.hidden", max_workers=5): # Contact the developer for the real base url
+    def __init__(self, base_url="http://real-base-url-is.hidden", max_workers=5, output=None, transport="http1",
+                 parse_processes=0, trace_path=None, shard=None, max_rps=None, rate_share=None, scan_cache=None,
+                 scan_mode="auto", dedup=True, budget=None, checkpoint=False,
+                 document_index=None, defer_stragglers=True, latency=None, h2_prior_knowledge=False): # Contact the developer for the real base url
         self.base_url = base_url
         self.max_workers = max_workers
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "en-US,en;q=0.5",
-            "X-Requested-With": "XMLHttpRequest",
-            "Referer": f"{base_url}/pengajuan"
-        })
+        # Processes for BeautifulSoup parsing (0 = parse in the worker threads)
+        self.parse_processes = parse_processes
+        self._parse_pool = None
+        # Chrome trace-event / Perfetto JSON written at the end of each run (None = off)
+        self.trace_path = trace_path
+        self.tracer = None
+        # Where documents are stored: FolderOutput (default) or ArchiveOutput
+        self.output = output if output is not None else FolderOutput()
+        # Only packages of this Shard are processed (None = all); a shard keeps
+        # its own manifest so several shards can share one output folder
+        self.shard = shard
+        # URL, size and checksum of every saved document, used by verify/repair
+        manifest_name = shard.manifest_name if shard else MANIFEST_NAME
+        self.manifest = DownloadManifest(os.path.join(self.output.root, manifest_name))
+        # Overall requests/second (None = unlimited); a shard gets rate_share of it (default 1/N)
+        self.request_budget = RequestBudget.for_shard(max_rps, shard, rate_share)
+        # dokumencetak responses kept on disk: a ScanCache, a cache file path or None.
+        # scan_mode "auto" uses cached scans and POSTs on a miss, "refresh" always
+        # POSTs and updates the cache, "cache-only" never POSTs and takes the
+        # packages from the cache instead of the listing
+        if isinstance(scan_cache, str):
+            scan_cache = ScanCache(scan_cache)
+        self.scan_cache = scan_cache
+        if scan_mode not in ("auto", "refresh", "cache-only"):
+            raise ValueError(f"Unknown scan mode: {scan_mode}")
+        if scan_mode == "cache-only" and scan_cache is None:
+            raise ValueError("Scan mode cache-only needs a scan cache")
+        self.scan_mode = scan_mode
+        # Store documents with identical content once (linked), indexed by SHA-256
+        self.dedup = dedup
+        self.content_index = None
+        # Search index of saved documents by NIK, name and package number:
+        # a DocumentIndex, an index file path or None
+        if isinstance(document_index, str):
+            document_index = DocumentIndex(document_index, root=self.output.root)
+        self.document_index = document_index
+        # RunBudget bounding each run by time, bytes or requests (None = unlimited)
+        self.budget = budget
+        self.budget_exhausted = None
+        # Opt-in: finished packages are recorded so a job cut short by its budget
+        # or Stop resumes where it stopped
+        self.use_checkpoint = checkpoint
+        self.checkpoint_path = os.path.join(self.output.root, f"run_checkpoint.{shard.label}.jsonl" if shard else CHECKPOINT_NAME)
+        self.checkpoint = None
+        self.resumed_count = 0
+        self._checkpoint_key = None
+        self._checkpoint_left = 0
+        # Request latencies per endpoint (LatencyTracker); with defer_stragglers a
+        # request slower than its endpoint's deadline is retried after the rest of the run
+        self.latency = latency if latency is not None else LatencyTracker()
+        self.defer_stragglers = defer_stragglers
+        self.deferred_count = 0
+        self._deferred = {}
+        self._deferring = False
+        # Between runs of a watch (see watch_mode) the parse pool and content
+        # index stay open instead of being rebuilt for every poll
+        self.keep_warm = False
+        # (package, finished cleanly) of each package processed, while download_changed runs
+        self._package_outcomes = None
+        # HTTP transport: "http1", "http2", "auto" or a ready transport instance;
+        # h2_prior_knowledge speaks HTTP/2 over plain http (h2c) without negotiation
+        if isinstance(transport, str):
+            transport = create_transport(transport, headers=default_headers(base_url), pool_size=max_workers,
+                                         prior_knowledge=h2_prior_knowledge)
+        self.transport = transport
         
         # Progress tracking
         self.is_downloading = False
@@ -36,24 +118,63 @@ class EnhancedDownloader:
         self.skipped_files = 0
         self.error_count = 0
         self.processed_count = 0
+        self.planned_bytes = 0
+        self.bytes_downloaded = 0
+        self.duplicate_files = 0
+        self.duplicate_bytes = 0
+        self.requests_sent = 0
+        self.requests_in_flight = 0
+        self.active_workers = 0
         
         # Thread-safe lock for counters
         self._lock = threading.Lock()
+        # Per-worker state (errors of the package being processed)
+        self._thread_state = threading.local()
         
         # Progress callback
         self.progress_callback = None
         self.status_callback = None
+        
+        # Live statistics, sampled by a ticker thread while a run is active
+        self.stats_callback = None
+        self.stats_interval = 1.0
+        self._stats = None
+        self._stats_ticker = None
+        
+        # Session renewal: session_callback() is asked for a new cookie when the
+        # session expires mid-run; workers wait on _session_ok meanwhile
+        self.session_callback = None
+        self.session_cookie = None
+        self.session_expired = False
+        self._session_ok = threading.Event()
+        self._session_ok.set()
+        self._session_generation = 0
+        self._renew_lock = threading.Lock()
+        
+        # Called with a record dict per finished package and document (see iter_documents)
+        self.record_callback = None
     
     def set_session_cookie(self, session_cookie):
         """Set the session cookie for the downloader."""
         if "ci_session=" not in session_cookie:
             session_cookie = f"ci_session={session_cookie}"
-        self.session.headers["Cookie"] = session_cookie
+        self.transport.headers["Cookie"] = session_cookie
+        # Also updated by a renewal, so callers starting another run can reuse it
+        self.session_cookie = session_cookie
     
-    def set_callbacks(self, progress_callback=None, status_callback=None):
-        """Set progress and status callbacks."""
+    def set_callbacks(self, progress_callback=None, status_callback=None, stats_callback=None,
+                      session_callback=None):
+        """Set progress, status, live statistics and session renewal callbacks.
+        
+        stats_callback receives a RunStats snapshot dict every stats_interval
+        seconds (from a background thread) while a run is active.
+        session_callback() is called from a worker thread when the session has
+        expired and returns a new cookie, or None to stop the run.
+        """
         self.progress_callback = progress_callback
         self.status_callback = status_callback
+        self.stats_callback = stats_callback
+        self.session_callback = session_callback
     
     def update_progress(self, current, total, message=""):
         """Update progress and call callback if set."""
@@ -77,11 +198,20 @@ class EnhancedDownloader:
     def stop_download(self):
         """Stop the download process."""
         self.should_stop = True
+        if self.tracer is not None:
+            self.tracer.instant("stop requested")
     
-    def _increment_downloaded(self):
-        """Thread-safe increment for downloaded files counter."""
+    def _increment_downloaded(self, size=0):
+        """Thread-safe increment for downloaded files and bytes counters."""
         with self._lock:
             self.downloaded_files += 1
+            self.bytes_downloaded += size
+    
+    def _increment_duplicate(self, size):
+        """Thread-safe increment for deduplicated files and the bytes they saved."""
+        with self._lock:
+            self.duplicate_files += 1
+            self.duplicate_bytes += size
     
     def _increment_skipped(self):
         """Thread-safe increment for skipped files counter."""
@@ -92,6 +222,7 @@ class EnhancedDownloader:
         """Thread-safe increment for error counter."""
         with self._lock:
             self.error_count += 1
+        self._thread_state.errors = getattr(self._thread_state, "errors", 0) + 1
     
     def _increment_processed(self):
         """Thread-safe increment for processed counter and update progress."""
@@ -99,58 +230,214 @@ class EnhancedDownloader:
             self.processed_count += 1
             return self.processed_count
     
-    def get_packages(self):
-        """Fetch all packages from the system."""
+    @contextlib.contextmanager
+    def _in_flight(self):
+        """Count a request as in flight for the live statistics."""
+        with self._lock:
+            self.requests_in_flight += 1
         try:
-            self.update_status("Fetching packages from server...")
-            response = self.session.get(f"{self.base_url}/pengajuan/data_pengajuan_ajax")
-            response.raise_for_status()
-            
-            packages_data = response.json()
-            all_packages = packages_data.get("data", [])
-            
-            self.update_status(f"Found {len(all_packages)} packages")
-            return all_packages
-            
-        except Exception as e:
-            self.update_status(f"Error fetching packages: {e}", "error")
-            return []
+            yield
+        finally:
+            with self._lock:
+                self.requests_in_flight -= 1
     
-    def parse_package(self, row):
-        """Parse a package row to extract information."""
+    def _emit_stats(self):
+        """Sample the counters and pass a snapshot to the stats callback."""
+        if self._stats is None or not self.stats_callback:
+            return
+        snapshot = self._stats.sample(self.processed_count, self.total_packages, self.bytes_downloaded,
+                                      self.error_count, self.requests_in_flight, self.active_workers)
         try:
-            # Row format: [index, link_html, nik, nama, phone, status_html, date_html]
-            link_html = row[1]
-            nik = row[2]
-            nama = row[3]
+            self.stats_callback(snapshot)
+        except Exception as e:
+            print(f"Stats callback error: {e}")
+    
+    def _span(self, name, cat="package", **args):
+        """Trace span for a block of work, a shared no-op when tracing is off."""
+        if self.tracer is None:
+            return _NO_SPAN
+        return self.tracer.span(name, cat, **args)
+    
+    def _deadline(self, endpoint):
+        """Straggler deadline in seconds for a request to endpoint, or None."""
+        if not self.defer_stragglers or self._deferring:
+            return None
+        return self.latency.deadline(endpoint)
+    
+    def _request(self, method, url, endpoint=None, deadline=None, **kwargs):
+        """Send a request through the configured transport.
+        
+        A response showing the session has expired pauses all workers until a
+        new cookie is provided, then the same request is sent again, so the run
+        continues exactly where it was. Raises SessionExpired if no cookie comes.
+        The latency of requests to an endpoint is tracked; one that gets no
+        response within deadline seconds raises Straggler.
+        """
+        streamed = kwargs.get("stream", False)
+        while True:
+            # Paused here while another worker renews the session
+            self._session_ok.wait()
+            generation = self._session_generation
+            if self.request_budget is not None:
+                self.request_budget.acquire()
+            with self._lock:
+                self.requests_sent += 1
+            started = time.perf_counter()
+            try:
+                response = self.transport.request(method, url, timeout=deadline, **kwargs)
+            except RequestTimedOut as e:
+                if endpoint is not None:
+                    self.latency.record(endpoint, time.perf_counter() - started)
+                if deadline is None:
+                    raise
+                raise Straggler(f"No response from {urlparse(url).path} within {deadline:.1f}s") from e
+            if endpoint is not None:
+                self.latency.record(endpoint, time.perf_counter() - started)
             
-            # Extract package code and number from the link HTML
-            link_match = re.search(r'href="pengajuan/lihat_paket/([^"]+)"[^>]*>([^<]+)</a>', link_html)
+            body = None if streamed else response.text
+            # A streamed body is not read here: an HTML page where a PDF or the JSON listing belongs is the login page
+            expect_document = streamed and (endpoint == "listing" or urlparse(url).path.lower().endswith(".pdf"))
+            if not session_lost(response, body, expect_document):
+                return response
+            response.close()
+            if not self._renew_session(generation):
+                raise SessionExpired(f"Session expired ({method} {urlparse(url).path})")
+    
+    def _renew_session(self, generation):
+        """Ask session_callback for a new cookie while all workers wait.
+        
+        Returns True when the request should be sent again, False when the run
+        has to stop. Workers that hit the expiry together get a single prompt.
+        """
+        with self._renew_lock:
+            if generation != self._session_generation:
+                # Another worker renewed the session already
+                return True
+            if self.session_callback is None or self.should_stop:
+                self._give_up_session()
+                return False
             
-            if link_match:
-                kode_paket_encoded = link_match.group(1)
-                nomor_paket = link_match.group(2)
+            self._session_ok.clear()
+            try:
+                self.update_status("Session expired - all workers paused until a new session cookie is provided", "warning")
+                if self.tracer is not None:
+                    self.tracer.instant("session expired")
+                try:
+                    cookie = self.session_callback()
+                except Exception as e:
+                    self.update_status(f"Session callback error: {e}", "error")
+                    cookie = None
+                if not cookie or self.should_stop:
+                    self._give_up_session()
+                    return False
                 
-                return {
-                    "kode_paket": kode_paket_encoded,
-                    "nomor": nomor_paket,
-                    "nama": nama,
-                    "nik": nik
-                }
+                self.set_session_cookie(cookie.strip())
+                self._session_generation += 1
+                self.update_status("Session cookie updated - resuming", "success")
+                return True
+            finally:
+                self._session_ok.set()
+    
+    def _give_up_session(self):
+        """Stop the run after the session expired for good."""
+        if not self.session_expired:
+            self.session_expired = True
+            self.update_status("Session expired and no new cookie was provided - stopping", "error")
+        self.should_stop = True
+    
+    def _listing_rows(self):
+        """Stream the raw rows of the package listing."""
+        while True:
+            generation = self._session_generation
+            response = self._request("GET", f"{self.base_url}/pengajuan/data_pengajuan_ajax", "listing", stream=True)
+            with response:
+                if response.status_code != 200:
+                    raise Exception(f"HTTP {response.status_code}")
+                chunks = response.iter_bytes(chunk_size=64 * 1024)
+                first = next(chunks, b"")
+                # A login page without an HTML content type would otherwise decode as an empty listing
+                if login_page_chunk(first):
+                    if self._renew_session(generation):
+                        continue
+                    raise SessionExpired("Session expired (the package listing is the login page)")
+                yield from iter_listing_rows(itertools.chain([first], chunks))
+                return
+    
+    def parse_package(self, row):
+        """Parse a package row into a PackageRecord."""
+        try:
+            return parse_row(row)
         except Exception as e:
             self.update_status(f"Error parsing package: {e}", "error")
         
         return None
     
-    def check_package_documents(self, package, document_types):
-        """Check a package for specified document types and download if found."""
-        if self.should_stop:
-            return False
+    def load_packages(self, package_filter=None):
+        """Fetch, parse and filter the package listing. Returns (packages, error).
         
+        Rows are decoded one at a time and parsed (and filtered) immediately, so
+        only the compact PackageRecords are kept in memory.
+        """
+        if package_filter is not None and not package_filter.is_active():
+            package_filter = None
+        
+        listed = 0
+        packages = []
         try:
-            # Fetch document details for this package
-            response = self.session.post(
+            if self.scan_mode == "cache-only":
+                self.update_status(f"Reading packages from scan cache {self.scan_cache.path}...")
+                source = self.scan_cache.packages()
+            else:
+                self.update_status("Fetching packages from server...")
+                source = (self.parse_package(row) for row in self._listing_rows())
+            with self._span("fetch listing", "http"):
+                for package in source:
+                    listed += 1
+                    if package and (package_filter is None or package_filter.matches(package)):
+                        packages.append(package)
+        except Exception as e:
+            self.update_status(f"Error fetching packages: {e}", "error")
+            if not listed:
+                return [], "No packages found"
+            # A broken stream must not pass for a complete listing
+            return [], f"Package listing incomplete after {listed} rows: {e}"
+        
+        if not listed:
+            return [], "No packages found"
+        self.update_status(f"Found {listed} packages")
+        
+        if package_filter is not None:
+            self.update_status(f"Filter ({package_filter.describe()}): {len(packages)} of {listed} packages selected")
+            if not packages:
+                return [], "No packages match the filter"
+        elif not packages:
+            return [], "No valid packages found"
+        
+        if self.shard is not None:
+            selected = len(packages)
+            packages = [package for package in packages if self.shard.contains(package)]
+            self.update_status(f"Shard {self.shard}: {len(packages)} of {selected} packages")
+            if not packages:
+                return [], f"No packages in shard {self.shard}"
+        
+        return packages, None
+    
+    def _listing_failed(self, error):
+        """Result of a run that got no packages to work on."""
+        result = {"success": False, "error": error}
+        if self.session_expired:
+            result.update(error="Session expired", session_expired=True)
+        return result
+    
+    def scan_package(self, package):
+        """Fetch the dokumencetak HTML for a package, or None if the server refused."""
+        # Fetch document details for this package
+        with self._span("POST dokumencetak", "http"), self._in_flight():
+            response = self._request(
+                "POST",
                 f"{self.base_url}/pengajuan/dokumencetak",
+                "scan",
+                self._deadline("scan"),
                 data={
                     "kode_paket": package['kode_paket'],
                     "nomor": package['nomor'],
@@ -160,120 +447,623 @@ class EnhancedDownloader:
             
             if response.status_code != 200:
                 self._increment_error()
-                return False
+                return None
             
             # Parse response
             try:
                 json_response = response.json()
                 if json_response.get("status") != "success":
                     self._increment_error()
-                    return False
-                html = json_response.get("data", "")
-            except:
+                    return None
+                return json_response.get("data", "")
+            except Exception:
                 # Fallback to treating as HTML if JSON parsing fails
-                html = response.text
-
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Find all document sections (each has a table with document info)
-            tables = soup.find_all('table', class_='table-bordered')
+                return response.text
+    
+    def _scan(self, package):
+        """Scan HTML for a package and whether it came from the scan cache."""
+        cache = self.scan_cache
+        if cache is not None and self.scan_mode != "refresh":
+            html = cache.get(package)
+            if html is not None:
+                return html, True
+            if self.scan_mode == "cache-only":
+                self.update_status(f"No cached scan for {package['nomor']}", "warning")
+                return None, False
+        
+        return self.scan_package(package), False
+    
+    def resolve_url(self, href):
+        """Make a document link absolute."""
+        if href.startswith('http'):
+            return href
+        return f"{self.base_url}{href}" if href.startswith('/') else f"{self.base_url}/{href}"
+    
+    def find_documents(self, package, document_types):
+        """Scan a package and return [(document type, PDF URL)] for the requested types."""
+        html, cached = self._scan(package)
+        if html is None:
+            return None
+        found = self._extract_documents(html)
+        if found and not cached and self.scan_cache is not None:
+            # A scan without documents may predate the upload, so only scans with documents are kept
+            self.scan_cache.put(package, html)
+        return [(jenis, self.resolve_url(href)) for jenis, href in found if jenis in document_types]
+    
+    def _extract_documents(self, html):
+        """Parse dokumencetak HTML, in the parse process pool when one is running."""
+        with self._span("parse", "cpu"):
+            if self._parse_pool is not None:
+                # Only the HTML goes out and the small (type, link) list comes back
+                return self._parse_pool.submit(extract_documents, html).result()
+            return extract_documents(html)
+    
+    def _start_parse_pool(self):
+        """Start the parse process pool if configured and useful on this interpreter."""
+        if self.parse_processes <= 0 or self._parse_pool is not None:
+            return
+        gil_check = getattr(sys, "_is_gil_enabled", None)
+        if gil_check is not None and not gil_check():
+            # Free-threaded build: worker threads already parse in parallel
+            self.update_status("Free-threaded Python detected, parsing in worker threads")
+            return
+        self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_processes)
+        self.update_status(f"Parsing responses in {self.parse_processes} processes")
+    
+    def _stop_parse_pool(self):
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=True, cancel_futures=True)
+            self._parse_pool = None
+    
+    def check_package_documents(self, package, document_types):
+        """Check a package for specified document types and download every one found."""
+        if self.should_stop:
+            return False
+        
+        try:
+            documents = self.find_documents(package, document_types)
+            if not documents:
+                return False
             
-            for table in tables:
-                rows = table.find_all('tr')
-                jenis = None
-                
-                # Look for the "Jenis" row
-                for row in rows:
-                    cells = row.find_all('td')
-                    if len(cells) >= 2:
-                        if cells[0].get_text(strip=True) == "Jenis":
-                            jenis = cells[1].get_text(strip=True)
-                            break
-                
-                # Check if this is one of the requested document types
-                if jenis in document_types:
-                    # Find the parent structure to locate the download link
-                    parent = table.find_parent('div', class_='col-md-6')
-                    if parent:
-                        download_link = parent.find('a', href=re.compile(r'_upload/DOKUMEN'))
-                        
-                        if download_link:
-                            return self.download_document(download_link, package, jenis)
+            results = [self.download_document(pdf_url, package, jenis) for jenis, pdf_url in documents]
+            return any(results)
             
+        except (SessionExpired, Straggler):
+            raise
+        except Exception as e:
+            self._increment_error()
+            self.update_status(f"Error checking package {package['nomor']}: {e}", "error")
+            return False
+    
+    def check_package_jobs(self, package, jobs):
+        """Scan a package once for every job that wants it and route each document to its jobs."""
+        if self.should_stop:
             return False
+        
+        try:
+            wanting = [job for job in jobs if job.wants(package)]
+            if not wanting:
+                return False
+            document_types = {jenis for job in wanting for jenis in job.document_types}
+            documents = self.find_documents(package, document_types)
+            if not documents:
+                return False
             
+            results = []
+            for jenis, pdf_url in documents:
+                targets = [job for job in wanting if jenis in job.document_types]
+                results.append(self.download_document(pdf_url, package, jenis, targets))
+            return any(results)
+            
+        except (SessionExpired, Straggler):
+            raise
         except Exception as e:
             self._increment_error()
             self.update_status(f"Error checking package {package['nomor']}: {e}", "error")
             return False
     
-    def download_document(self, download_link, package, document_type):
-        """Download a document."""
+    def download_document(self, pdf_url, package, document_type, jobs=None):
+        """Download a document.
+        
+        With jobs (the DownloadJobs of a batched run that want this document) the
+        body is fetched once and written to the output of every job.
+        """
+        started = time.perf_counter()
+        targets = jobs or [self]
+        # Outcome per target for record_callback, filled in along the way
+        outcomes = [{"status": "failed"} for _ in targets]
+        pending = []
         try:
-            pdf_url = download_link.get('href')
-            
             # Make URL absolute if needed
-            if not pdf_url.startswith('http'):
-                pdf_url = f"{self.base_url}{pdf_url}" if pdf_url.startswith('/') else f"{self.base_url}/{pdf_url}"
-            
-            # Create folder for document type
-            download_folder = f"{document_type.replace(' ', '_')}_Downloads"
-            if not os.path.exists(download_folder):
-                os.makedirs(download_folder)
+            pdf_url = self.resolve_url(pdf_url)
             
             # Extract filename
             filename = pdf_url.split('/')[-1]
-            filepath = os.path.join(download_folder, filename)
             
             # Check if already downloaded
-            if os.path.exists(filepath):
-                self._increment_skipped()
-                self.update_status(f"Already exists: {filename}", "info")
+            for target, outcome in zip(targets, outcomes):
+                outcome["filename"] = filename
+                if target.output.exists(document_type, filename):
+                    self._increment_skipped()
+                    self._count_job(target, "skipped")
+                    self.update_status(f"Already exists: {filename}{self._job_suffix(target)}", "info")
+                    outcome.update(status="skipped", location=target.output.location(document_type, filename))
+                else:
+                    pending.append((target, outcome))
+            if not pending:
                 return True
-            else:
-                # Download the file
-                self.update_status(f"Downloading: {filename}", "info")
-                
-                pdf_response = requests.get(pdf_url, stream=True)
+            
+            # Download the file
+            self.update_status(f"Downloading: {filename}", "info")
+            
+            deadline = self._deadline("download")
+            with self._span("download", "http", file=filename), self._in_flight(), \
+                    self._request("GET", pdf_url, "download", deadline, stream=True) as pdf_response:
                 if pdf_response.status_code == 200:
-                    with open(filepath, 'wb') as f:
-                        for chunk in pdf_response.iter_content(chunk_size=8192):
+                    writers = []
+                    last_chunk = time.perf_counter()
+                    try:
+                        for target, _ in pending:
+                            writers.append(target.output.open(document_type, filename))
+                        for chunk in pdf_response.iter_bytes(chunk_size=8192):
                             if self.should_stop:
                                 break
-                            f.write(chunk)
+                            for writer in writers:
+                                writer.write(chunk)
+                            last_chunk = time.perf_counter()
+                    except Exception as e:
+                        for writer in writers:
+                            writer.abort()
+                        # The deadline is also the read timeout: a body that stalls that long is a straggler
+                        if deadline is not None and time.perf_counter() - last_chunk >= deadline:
+                            raise Straggler(f"{filename} stalled for {deadline:.1f}s") from e
+                        raise
                     
-                    if not self.should_stop:
-                        self._increment_downloaded()
-                        self.update_status(f"✓ Saved: {filename}", "success")
-                        return True
+                    if self.should_stop:
+                        # Never leave a truncated document behind
+                        for writer, (_, outcome) in zip(writers, pending):
+                            writer.abort()
+                            outcome["status"] = "stopped"
+                        return False
+                    
+                    # A dropped connection can end the body early without an error
+                    size = writers[0].size
+                    expected = pdf_response.headers.get("Content-Length")
+                    if expected and not pdf_response.headers.get("Content-Encoding") and int(expected) != size:
+                        self._increment_error()
+                        self.update_status(f"Incomplete download: {filename} ({size} of {expected} bytes)", "error")
+                        for writer, (target, outcome) in zip(writers, pending):
+                            writer.abort()
+                            self._count_job(target, "errors")
+                            outcome["error"] = f"incomplete ({size} of {expected} bytes)"
+                        return False
+                    
+                    saved = False
+                    for writer, (target, outcome) in zip(writers, pending):
+                        try:
+                            entry = self._save_document(target, writer, pdf_url, package, document_type)
+                        except Exception as e:
+                            writer.abort()
+                            self._increment_error()
+                            self._count_job(target, "errors")
+                            self.update_status(f"Save error: {filename}{self._job_suffix(target)}: {e}", "error")
+                            outcome["error"] = str(e)
+                            continue
+                        # The body was fetched once, however many jobs keep a copy
+                        self._increment_downloaded(0 if saved else size)
+                        self._count_job(target, "downloaded")
+                        saved = True
+                        if "duplicate_of" in entry:
+                            self._increment_duplicate(size)
+                            self.update_status(f"✓ Saved: {filename}{self._job_suffix(target)} (same content as "
+                                               f"{entry['duplicate_of']}, {entry['link']})", "success")
+                        else:
+                            self.update_status(f"✓ Saved: {filename}{self._job_suffix(target)}", "success")
+                        outcome.update(status="saved", location=target.output.location(document_type, filename),
+                                       bytes=size, sha256=writer.sha256, duplicate_of=entry.get("duplicate_of"))
+                    return saved
                 else:
                     self._increment_error()
                     self.update_status(f"Failed to download (HTTP {pdf_response.status_code})", "error")
+                    for target, outcome in pending:
+                        self._count_job(target, "errors")
+                        outcome["error"] = f"HTTP {pdf_response.status_code}"
                     
+        except SessionExpired:
+            for _, outcome in pending:
+                outcome["status"] = "interrupted"
+            raise
+        except Straggler as e:
+            # Only the slow document waits for the deferred pass, the rest of the package goes on
+            self.update_status(f"Slow response, retrying at the end: {filename} ({e})", "warning")
+            for _, outcome in pending:
+                outcome["status"] = "deferred"
+            self._defer(package, lambda: self.download_document(pdf_url, package, document_type, jobs))
         except Exception as e:
             self._increment_error()
             self.update_status(f"Download error: {e}", "error")
+            for target, outcome in pending:
+                self._count_job(target, "errors")
+                outcome["error"] = str(e)
+        finally:
+            if self.record_callback is not None:
+                for target, outcome in zip(targets, outcomes):
+                    record = dict(outcome, kind="document", document_type=document_type, url=pdf_url,
+                                  seconds=time.perf_counter() - started, **self._package_fields(package))
+                    if jobs:
+                        record["job"] = target.name
+                    if outcome["status"] == "deferred":
+                        self._hold_record(package, record)
+                    else:
+                        self._emit_record(record)
         
         return False
     
-    def _process_package(self, package, document_types, total_packages):
-        """Process a single package - wrapper for concurrent execution."""
+    def _save_document(self, target, writer, pdf_url, package, document_type):
+        """Commit a downloaded document to a target (the downloader or a DownloadJob) and record it."""
+        with self._span("write", "io", bytes=writer.size):
+            entry = {
+                "document_type": document_type,
+                "filename": pdf_url.split('/')[-1],
+                "url": pdf_url,
+                "size": writer.size,
+                "sha256": writer.sha256,
+                "nomor": package.get("nomor"),
+                "nik": package.get("nik"),
+                "nama": package.get("nama"),
+                "kode_paket": package.get("kode_paket")
+            }
+            # Identical content saved before is linked instead of stored again
+            original = None
+            if target.content_index is not None:
+                original = target.content_index.lookup(writer.sha256, writer.size)
+            if original is not None:
+                location, link = writer.commit_duplicate(original)
+                if link is not None:
+                    entry.update(duplicate_of=original, link=link)
+                elif target.content_index is not None:
+                    # The original could not be linked (gone, changed or no link support): link to this copy instead
+                    target.content_index.replace(writer.sha256, writer.size, location)
+            else:
+                location = writer.commit()
+                if target.content_index is not None:
+                    target.content_index.add(writer.sha256, writer.size, location)
+            entry["location"] = location
+            target.manifest.record(entry)
+            if target.document_index is not None:
+                target.document_index.add(entry)
+        return entry
+    
+    def _count_job(self, target, key):
+        """Count a document outcome for a job of a batched run."""
+        if target is not self:
+            with self._lock:
+                target.counts[key] += 1
+    
+    def _job_suffix(self, target):
+        return "" if target is self else f" [{target.name}]"
+    
+    def repair_downloads(self, report, session_cookie):
+        """Re-download the bad files found by integrity.verify_downloads.
+        
+        Bad files are moved to _quarantine first. Files the manifest has a URL
+        for are fetched again right away, under their original package fields;
+        the others are picked up by the next normal download run, which only
+        fetches missing files. Bad archive members cannot be replaced inside
+        their shard and are only reported.
+        """
+        self._start_run(session_cookie)
+        
+        try:
+            root = report["root"]
+            for path in report["partials"]:
+                os.remove(path)
+            
+            to_fetch = []
+            unresolved = 0
+            archived = 0
+            for bad in report["bad"]:
+                if bad.get("archive"):
+                    archived += 1
+                    continue
+                quarantine(bad["path"], root)
+                if bad["url"]:
+                    row = {key: bad.get(key) for key in ("nomor", "nama", "nik", "kode_paket")}
+                    # Entries written before the manifest kept package fields
+                    row["nomor"] = row["nomor"] or os.path.basename(bad["path"])
+                    row["nama"] = row["nama"] or ""
+                    row.update(pdf_url=bad["url"], document_type=bad["document_type"])
+                    to_fetch.append(row)
+                else:
+                    unresolved += 1
+            
+            self.update_status(f"Repair: {len(to_fetch)} files queued, {len(report['partials'])} partial files removed")
+            if unresolved:
+                self.update_status(f"{unresolved} bad files have no manifest entry; run a normal download to fetch them again", "warning")
+            if archived:
+                self.update_status(f"{archived} bad archive members cannot be repaired inside their shards", "warning")
+                unresolved += archived
+            
+            if to_fetch:
+                self._run_packages(to_fetch, lambda row: self.download_document(row["pdf_url"], row, row["document_type"]))
+            
+            result = self._download_summary(len(to_fetch))
+            result["unresolved"] = unresolved
+            return result
+            
+        except Exception as e:
+            self.update_status(f"Repair failed: {e}", "error")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._finish_run()
+    
+    def fetch_size(self, pdf_url):
+        """Get a document's size from Content-Length without transferring the body."""
+        try:
+            response = self._request("HEAD", pdf_url, "size")
+            if response.status_code == 405:
+                # HEAD not allowed: read the headers of a streamed GET and hang up
+                with self._request("GET", pdf_url, stream=True) as response:
+                    length = response.headers.get("Content-Length")
+            else:
+                length = response.headers.get("Content-Length") if response.status_code == 200 else None
+            return int(length) if length is not None else None
+        except SessionExpired:
+            raise
+        except Exception as e:
+            self.update_status(f"Size check failed for {pdf_url}: {e}", "warning")
+            return None
+    
+    def _plan_package(self, package, document_types, writer, fetch_sizes):
+        """Scan one package and add its documents to the plan."""
         if self.should_stop:
+            return False
+        
+        try:
+            documents = self.find_documents(package, document_types)
+            if not documents:
+                return False
+            
+            for jenis, pdf_url in documents:
+                size = self.fetch_size(pdf_url) if fetch_sizes else None
+                writer.add({
+                    "nomor": package['nomor'],
+                    "nama": package['nama'],
+                    "nik": package['nik'],
+                    "kode_paket": package['kode_paket'],
+                    "document_type": jenis,
+                    "pdf_url": pdf_url,
+                    "filename": pdf_url.split('/')[-1],
+                    "size": size
+                })
+                if size:
+                    with self._lock:
+                        self.planned_bytes += size
+            return True
+            
+        except (SessionExpired, Straggler):
+            raise
+        except Exception as e:
+            self._increment_error()
+            self.update_status(f"Error planning package {package['nomor']}: {e}", "error")
+            return False
+    
+    def _budget_reached(self):
+        """Check the run budget; once used up, no new package is started."""
+        if self.budget is None or self.budget_exhausted:
+            return self.budget_exhausted
+        reason = self.budget.exhausted(self.bytes_downloaded, self.requests_sent)
+        if reason:
+            with self._lock:
+                if self.budget_exhausted:
+                    return self.budget_exhausted
+                self.budget_exhausted = reason
+            self.update_status(f"Budget reached ({reason}): finishing the packages in progress", "warning")
+            if self.tracer is not None:
+                self.tracer.instant("budget reached", reason=reason)
+        return self.budget_exhausted
+    
+    def _resume(self, items, job, key):
+        """Drop the items an earlier run of the same job finished, and start the checkpoint.
+        
+        key(item) is what the checkpoint records: kode_paket for packages, the
+        PDF URL for plan rows.
+        """
+        if not self.use_checkpoint:
+            return items
+        self.checkpoint = RunCheckpoint(self.checkpoint_path, json.dumps(job, ensure_ascii=False))
+        self._checkpoint_key = key
+        done = self.checkpoint.load()
+        self.checkpoint.open()
+        if done:
+            remaining = [item for item in items if key(item) not in done]
+            self.resumed_count = len(items) - len(remaining)
+            self.update_status(f"Resuming from checkpoint: {self.resumed_count} already done, {len(remaining)} left")
+            items = remaining
+        self._checkpoint_left = len(items)
+        return items
+    
+    def _mark_done(self, item):
+        """Record a finished item in the checkpoint."""
+        self.checkpoint.mark(self._checkpoint_key(item))
+        with self._lock:
+            self._checkpoint_left -= 1
+    
+    def _process_package(self, package, handler, total_packages, queued_at=None):
+        """Process a single package - wrapper for concurrent execution."""
+        if self.should_stop or self._budget_reached():
             return None
         
+        if queued_at is not None:
+            self.tracer.async_span("queued", package['nomor'], queued_at, self.tracer.now())
+        
+        with self._lock:
+            self.active_workers += 1
+        started = time.perf_counter()
+        status = "error"
+        self._thread_state.errors = 0
+        self._thread_state.deferred = False
         try:
-            result = self.check_package_documents(package, document_types)
+            with self._span(f"package {package['nomor']}"):
+                result = handler(package)
+            if self._thread_state.deferred:
+                # Counted and checkpointed once its deferred documents are done
+                status = "deferred"
+                self._deferred[id(package)]["errors"] = self._thread_state.errors
+                return result
+            status = "done"
+            # Packages with errors or without documents stay out of the checkpoint
+            # so the next run checks them again
+            if self.checkpoint is not None and result and not self._thread_state.errors and not self.should_stop:
+                self._mark_done(package)
             processed = self._increment_processed()
             self.update_progress(processed, total_packages, 
                                f"Processed: {package['nomor']} - {package['nama']}")
             return result
+        except SessionExpired:
+            # Neither processed nor an error: the next run picks it up
+            status = "interrupted"
+            return None
+        except Straggler as e:
+            self.update_status(f"Slow response for {package['nomor']}, retrying at the end ({e})", "warning")
+            status = "deferred"
+            self._defer(package, lambda: handler(package))
+            return None
         except Exception as e:
             self._increment_error()
             self.update_status(f"Error processing {package['nomor']}: {e}", "error")
             return False
+        finally:
+            with self._lock:
+                self.active_workers -= 1
+            if self._package_outcomes is not None and status in ("done", "error") and not self.should_stop:
+                self._package_outcomes.append((package, status == "done" and not self._thread_state.errors))
+            if self.record_callback is not None:
+                record = dict(self._package_fields(package), kind="package", status=status,
+                              ok=status == "done" and bool(result), seconds=time.perf_counter() - started)
+                if status == "deferred":
+                    self._hold_record(package, record)
+                else:
+                    self._emit_record(record)
+    
+    def _defer(self, package, retry):
+        """Queue retry() for the deferred pass at the end of the run."""
+        with self._lock:
+            entry = self._deferred.setdefault(id(package), {"package": package, "retries": [], "errors": 0,
+                                                            "records": []})
+            entry["retries"].append(retry)
+            self.deferred_count += 1
+        self._thread_state.deferred = True
+        if self.tracer is not None:
+            self.tracer.instant("deferred", package=package.get("nomor"))
+    
+    def _hold_record(self, package, record):
+        """Keep a "deferred" record back: the deferred pass emits the final one."""
+        with self._lock:
+            self._deferred[id(package)]["records"].append(record)
     
-    def bulk_download(self, document_types, session_cookie):
-        """Start bulk download with specified document types using concurrent workers."""
+    def _run_deferred(self, total_packages):
+        """Retry the deferred stragglers on fresh connections, without deadlines."""
+        deferred = list(self._deferred.values())
+        self._deferred = {}
+        if not deferred:
+            return
+        if self.should_stop or self.budget_exhausted:
+            # Left unchecked in the checkpoint, so the next run retries them
+            if self.record_callback is not None:
+                for entry in deferred:
+                    for record in entry["records"]:
+                        self._emit_record(record)
+            return
+        
+        self.update_status(f"Retrying {sum(len(entry['retries']) for entry in deferred)} slow requests "
+                           f"of {len(deferred)} packages on fresh connections...", "warning")
+        self._deferring = True
+        try:
+            # A slow connection is a common cause; the retries should not inherit it
+            self.transport.reset()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self._process_package, entry["package"],
+                                    lambda pkg, entry=entry: self._retry_deferred(entry), total_packages)
+                    for entry in deferred
+                ]
+                for future in as_completed(futures):
+                    if self.should_stop:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        break
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self._increment_error()
+                        self.update_status(f"Worker error: {e}", "error")
+        finally:
+            self._deferring = False
+    
+    def _retry_deferred(self, entry):
+        """Run the deferred work of one package."""
+        # Errors from the package's first pass still keep it out of the checkpoint
+        self._thread_state.errors = entry["errors"]
+        return any([retry() for retry in entry["retries"]])
+    
+    def _latency_report(self):
+        """Log the tail latency figures of the run and return them for the summary."""
+        report = self.latency.summary()
+        for endpoint, figures in report.items():
+            self.update_status(f"Latency {endpoint}: p50 {figures['p50_ms']:.0f} ms, p90 {figures['p90_ms']:.0f} ms, "
+                               f"p99 {figures['p99_ms']:.0f} ms, max {figures['max_ms']:.0f} ms "
+                               f"({figures['requests']} requests)")
+        if self.deferred_count:
+            self.update_status(f"{self.deferred_count} slow requests were deferred and retried at the end")
+        return report
+    
+    @staticmethod
+    def _package_fields(package):
+        return {key: package.get(key) for key in ("nomor", "nama", "nik", "kode_paket")}
+    
+    def _emit_record(self, record):
+        record["finished"] = time.time()
+        try:
+            self.record_callback(record)
+        except Exception as e:
+            print(f"Record callback error: {e}")
+    
+    def _run_packages(self, packages, handler):
+        """Run handler(package) for every package on the worker pool."""
+        total_packages = len(packages)
+        self.total_packages = total_packages
+        
+        # Use ThreadPoolExecutor for concurrent downloads
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Submit all packages for processing
+            futures = {
+                executor.submit(self._process_package, pkg, handler, total_packages,
+                                self.tracer.now() if self.tracer else None): pkg 
+                for pkg in packages
+            }
+            
+            # Process completed futures
+            for future in as_completed(futures):
+                if self.should_stop:
+                    self.update_status("Stopping workers...", "warning")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+                if self._budget_reached():
+                    # Packages already running finish when the executor exits
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+                
+                # Exceptions are handled within _process_package
+                try:
+                    future.result()
+                except Exception as e:
+                    self._increment_error()
+                    self.update_status(f"Worker error: {e}", "error")
+        
+        self._run_deferred(total_packages)
+    
+    def _start_run(self, session_cookie):
+        """Reset state and counters for a new run."""
         self.is_downloading = True
         self.should_stop = False
         
@@ -282,76 +1072,445 @@ class EnhancedDownloader:
         self.skipped_files = 0
         self.error_count = 0
         self.processed_count = 0
+        self.planned_bytes = 0
+        self.bytes_downloaded = 0
+        self.duplicate_files = 0
+        self.duplicate_bytes = 0
+        self.total_packages = 0
+        self.requests_sent = 0
+        self.budget_exhausted = None
+        self.resumed_count = 0
+        self.checkpoint = None
+        self.deferred_count = 0
+        self._deferred = {}
+        self._deferring = False
+        self.latency.reset()
+        self.session_expired = False
+        self._session_ok.set()
+        if self.budget is not None:
+            self.budget.start()
+        if self.scan_cache is not None:
+            self.scan_cache.hits = self.scan_cache.misses = 0
+        
+        # Set session cookie
+        self.set_session_cookie(session_cookie)
+        
+        if self.dedup and (self.content_index is None or not self.keep_warm):
+            self.content_index = ContentIndex.from_manifest(self.manifest)
+        
+        if self.trace_path:
+            self.tracer = TraceRecorder()
+            # Wait time on the counter lock shows up as "wait _lock" spans
+            self._lock = TracedLock(self.tracer)
+            self.tracer.instant("run start")
+        
+        self._start_parse_pool()
+        
+        if self.stats_callback:
+            self._stats = RunStats()
+            self._stats_ticker = StatsTicker(self._emit_stats, self.stats_interval)
+            self._stats_ticker.start()
+    
+    def _finish_run(self):
+        """Release run resources."""
+        if not self.keep_warm:
+            self._stop_parse_pool()
+        
+        if self.checkpoint is not None:
+            # Kept only when the budget or Stop left packages unstarted
+            keep = bool(self.should_stop or self.budget_exhausted) and self._checkpoint_left > 0
+            self.checkpoint.close(keep)
+            if keep:
+                self.update_status(f"Checkpoint saved to {self.checkpoint_path}: {self._checkpoint_left} left, "
+                                   "the next run of this job continues from there")
+            self.checkpoint = None
+        
+        if self.scan_cache is not None and self.scan_cache.hits + self.scan_cache.misses:
+            stats = self.scan_cache.stats()
+            self.update_status(f"Scan cache: {stats['hits']} hits, {stats['misses']} misses, "
+                               f"{stats['entries']} scans ({stats['bytes'] / (1024 * 1024):.1f} MB)")
+        
+        if self._stats_ticker is not None:
+            self._stats_ticker.stop()
+            self._stats_ticker = None
+            self._stats = None
+        
+        if self.tracer is not None:
+            try:
+                events = self.tracer.save(self.trace_path)
+                self.update_status(f"Trace written to {self.trace_path} ({events} events)")
+            except Exception as e:
+                self.update_status(f"Error writing trace: {e}", "error")
+            self.tracer = None
+            self._lock = threading.Lock()
+        
+        # Finalize any open archive shard so its index is complete; a watch also
+        # does this after every poll, before it records the packages as handled
+        self._close_output()
+        self.is_downloading = False
+    
+    def _close_output(self):
+        try:
+            self.output.close()
+        except Exception as e:
+            self.update_status(f"Error finalizing output: {e}", "error")
+    
+    def close(self):
+        """Release what keep_warm kept open between runs, the connections, scan cache and document index."""
+        self._stop_parse_pool()
+        self._close_output()
+        self.content_index = None
+        self.transport.close()
+        if self.scan_cache is not None:
+            self.scan_cache.close()
+        if self.document_index is not None:
+            self.document_index.close()
+    
+    def _download_summary(self, total_packages):
+        """Log the final summary and build the result dict."""
+        if self.session_expired:
+            remaining = total_packages - self.processed_count
+            self.update_status(f"Download stopped: session expired with {remaining} packages left. "
+                               "Run again with a new session cookie; saved files are skipped.", "warning")
+        elif self.budget_exhausted:
+            remaining = total_packages - self.processed_count
+            self.update_status(f"Download paused: {self.budget_exhausted} reached with {remaining} left", "warning")
+        elif self.should_stop:
+            self.update_status("Download stopped by user", "warning")
+        else:
+            self.update_status("Download completed!")
+        
+        self.update_status(f"Summary: {self.downloaded_files} downloaded, {self.skipped_files} skipped, {self.error_count} errors")
+        if self.duplicate_files:
+            self.update_status(f"Duplicates: {self.duplicate_files} files had the same content as a saved one "
+                               f"and were linked ({self.duplicate_bytes / (1024 * 1024):.1f} MB not stored twice)")
+        
+        result = {
+            "success": not self.session_expired,
+            "downloaded": self.downloaded_files,
+            "skipped": self.skipped_files,
+            "errors": self.error_count,
+            "total_packages": total_packages
+        }
+        if self.dedup:
+            result["duplicates"] = self.duplicate_files
+            result["duplicate_bytes"] = self.duplicate_bytes
+        result["latency"] = self._latency_report()
+        if self.deferred_count:
+            result["deferred"] = self.deferred_count
+        if self.budget_exhausted:
+            result["budget_exhausted"] = self.budget_exhausted
+            result["remaining"] = total_packages - self.processed_count
+        if self.resumed_count:
+            result["resumed"] = self.resumed_count
+        if self.session_expired:
+            result["error"] = "Session expired"
+            result["session_expired"] = True
+            result["remaining"] = total_packages - self.processed_count
+        return result
+    
+    def bulk_download(self, document_types, session_cookie, package_filter=None):
+        """Start bulk download with specified document types using concurrent workers.
+        
+        package_filter (PackageFilter) drops packages by date, status or NIK/package
+        number before any dokumencetak request is sent.
+        """
+        self._start_run(session_cookie)
         
         try:
-            # Set session cookie
-            self.set_session_cookie(session_cookie)
+            packages, error = self.load_packages(package_filter)
+            if error:
+                return self._listing_failed(error)
+            
+            filter_text = package_filter.describe() if package_filter is not None and package_filter.is_active() else ""
+            job = ["download", sorted(document_types), filter_text, str(self.shard or "")]
+            packages = self._resume(packages, job, lambda pkg: pkg['kode_paket'])
+            total_packages = len(packages)
+            if self.budget is not None and self.budget.is_active():
+                self.update_status(f"Run budget: {self.budget.describe()}")
+            
+            # Start concurrent download process
+            self.update_status(f"Starting concurrent download for {total_packages} packages...")
+            self.update_status(f"Document types: {', '.join(document_types)}")
+            self.update_status(f"Using {self.max_workers} concurrent workers ({self.transport.name})")
+            
+            self._run_packages(packages, lambda pkg: self.check_package_documents(pkg, document_types))
             
-            # Get all packages
-            all_packages_data = self.get_packages()
-            if not all_packages_data:
-                return {"success": False, "error": "No packages found"}
+            return self._download_summary(total_packages)
+            
+        except Exception as e:
+            self.update_status(f"Download failed: {e}", "error")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._finish_run()
+    
+    def download_changed(self, document_types, session_cookie, known, failed, package_filter=None):
+        """One watch poll: fetch the listing and process only new or changed packages.
+        
+        known maps kode_paket to the fingerprint (watch_mode.package_fingerprint)
+        of every package handled so far, failed to the fingerprint a package had
+        when it last failed. Both are updated in place. The result is the
+        bulk_download summary plus "changed" (packages processed) and "new"
+        (those not already failed in this state before).
+        """
+        self._start_run(session_cookie)
+        
+        try:
+            packages, error = self.load_packages(package_filter)
+            if error:
+                return self._listing_failed(error)
             
-            # Parse packages
-            packages = []
-            for row in all_packages_data:
-                package = self.parse_package(row)
-                if package:
-                    packages.append(package)
+            changed = []
+            new = 0
+            for package in packages:
+                fingerprint = package_fingerprint(package)
+                if known.get(package['kode_paket']) != fingerprint:
+                    changed.append((package, fingerprint))
+                    if failed.get(package['kode_paket']) != fingerprint:
+                        new += 1
+            if not changed:
+                self.update_status("No new or changed packages")
+                return {"success": True, "changed": 0, "new": 0, "downloaded": 0, "skipped": 0, "errors": 0,
+                        "total_packages": 0}
             
+            self.update_status(f"{len(changed)} new or changed packages ({len(changed) - new} retried)")
+            fingerprints = {package['kode_paket']: fingerprint for package, fingerprint in changed}
+            self._package_outcomes = []
+            self._run_packages([package for package, _ in changed],
+                               lambda pkg: self.check_package_documents(pkg, document_types))
+            
+            for package, clean in self._package_outcomes:
+                if clean:
+                    known[package['kode_paket']] = fingerprints[package['kode_paket']]
+                    failed.pop(package['kode_paket'], None)
+                else:
+                    failed[package['kode_paket']] = fingerprints[package['kode_paket']]
+            
+            result = self._download_summary(len(changed))
+            result["changed"] = len(changed)
+            result["new"] = new
+            return result
+            
+        except Exception as e:
+            self.update_status(f"Download failed: {e}", "error")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._package_outcomes = None
+            self._finish_run()
+    
+    def iter_documents(self, document_types, session_cookie, package_filter=None, max_pending=1000):
+        """Run bulk_download and yield a record dict as each document and package finishes.
+        
+        Document records (kind "document") carry the package fields, document_type,
+        filename, url, status (saved, skipped, failed, stopped, interrupted, deferred),
+        location, bytes, sha256 and seconds; package records (kind "package") follow
+        once all of a package's documents are done. Every document and package gets
+        one record: work deferred as a straggler is reported after its retry at the
+        end of the run, with status "deferred" only when the run stopped before the
+        retry. The last record has kind "summary" and the bulk_download result. At most max_pending records are buffered: a slow
+        consumer slows the workers down. Closing the generator early stops the run.
+        """
+        records = queue.Queue(maxsize=max_pending)
+        finished = object()
+        previous_callback = self.record_callback
+        self.record_callback = records.put
+        
+        def run():
+            try:
+                summary = self.bulk_download(document_types, session_cookie, package_filter)
+            except Exception as e:
+                summary = {"success": False, "error": str(e)}
+            records.put(dict(summary, kind="summary"))
+            records.put(finished)
+        
+        thread = threading.Thread(target=run, name="iter_documents", daemon=True)
+        thread.start()
+        try:
+            while True:
+                record = records.get()
+                if record is finished:
+                    return
+                yield record
+        finally:
+            if thread.is_alive():
+                self.stop_download()
+                # Keep draining so workers blocked on a full queue can finish
+                while thread.is_alive():
+                    try:
+                        records.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            self.record_callback = previous_callback
+    
+    async def aiter_documents(self, document_types, session_cookie, package_filter=None, max_pending=1000):
+        """Async variant of iter_documents for asyncio pipelines.
+        
+        The run stays on its worker threads; each record is awaited without
+        blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        records = self.iter_documents(document_types, session_cookie, package_filter, max_pending)
+        finished = object()
+        try:
+            while True:
+                record = await loop.run_in_executor(None, next, records, finished)
+                if record is finished:
+                    break
+                yield record
+        finally:
+            await loop.run_in_executor(None, records.close)
+    
+    def download_jobs(self, jobs, session_cookie):
+        """Run several DownloadJobs as one execution.
+        
+        The listing is fetched once and each package any job selects is scanned
+        once for the union of the jobs' document types; every document is
+        downloaded once and saved to each job whose types and filter it matches.
+        The result is the bulk_download summary plus per-job counts under "jobs".
+        """
+        check_jobs(jobs)
+        self._start_run(session_cookie)
+        
+        try:
+            manifest_name = self.shard.manifest_name if self.shard else MANIFEST_NAME
+            for job in jobs:
+                job.prepare(manifest_name, self.dedup)
+            
+            # Filters are applied per job; the batch keeps every package some job wants
+            packages, error = self.load_packages()
+            if error:
+                return self._listing_failed(error)
+            packages = [package for package in packages if any(job.wants(package) for job in jobs)]
+            for job in jobs:
+                job.counts["packages"] = sum(1 for package in packages if job.wants(package))
+                filter_text = f", filter {job.package_filter.describe()}" if job.package_filter is not None else ""
+                self.update_status(f"Job {job.name}: {', '.join(job.document_types)}{filter_text} -> "
+                                   f"{job.output.root} ({job.counts['packages']} packages)")
             if not packages:
-                return {"success": False, "error": "No valid packages found"}
+                return {"success": False, "error": "No packages match any job"}
             
+            batch = ["batch", [job.describe() for job in jobs], str(self.shard or "")]
+            packages = self._resume(packages, batch, lambda pkg: pkg['kode_paket'])
             total_packages = len(packages)
+            if self.budget is not None and self.budget.is_active():
+                self.update_status(f"Run budget: {self.budget.describe()}")
             
-            # Start concurrent download process
-            self.update_status(f"Starting concurrent download for {total_packages} packages...")
+            self.update_status(f"Starting batched download of {len(jobs)} jobs for {total_packages} packages...")
+            self.update_status(f"Using {self.max_workers} concurrent workers ({self.transport.name})")
+            
+            self._run_packages(packages, lambda pkg: self.check_package_jobs(pkg, jobs))
+            
+            result = self._download_summary(total_packages)
+            for job in jobs:
+                self.update_status(f"Job {job.name}: {job.counts['downloaded']} downloaded, "
+                                   f"{job.counts['skipped']} skipped, {job.counts['errors']} errors")
+            result["jobs"] = {job.name: job.result() for job in jobs}
+            return result
+            
+        except Exception as e:
+            self.update_status(f"Download failed: {e}", "error")
+            return {"success": False, "error": str(e)}
+        finally:
+            for job in jobs:
+                try:
+                    job.close()
+                except Exception as e:
+                    self.update_status(f"Error finalizing output of job {job.name}: {e}", "error")
+            self._finish_run()
+    
+    def _plan_summary(self, rows):
+        """Log documents and known size per document type of plan rows and return them."""
+        summary = summarize_plan(rows)
+        for document_type, entry in sorted(summary.items()):
+            unknown = f", {entry['unknown_size']} of unknown size" if entry["unknown_size"] else ""
+            self.update_status(f"  {document_type}: {entry['documents']} documents, "
+                               f"{entry['bytes'] / (1024 * 1024):.1f} MB{unknown}")
+        return summary
+    
+    def plan_download(self, document_types, session_cookie, plan_path, package_filter=None, fetch_sizes=True):
+        """Scan packages and write a document index (plan) without downloading any PDF.
+        
+        Sizes come from HEAD requests (Content-Length) unless fetch_sizes is False.
+        The plan is consumed later by execute_plan.
+        """
+        self._start_run(session_cookie)
+        
+        try:
+            packages, error = self.load_packages(package_filter)
+            if error:
+                return self._listing_failed(error)
+            
+            total_packages = len(packages)
+            self.update_status(f"Planning {total_packages} packages into {plan_path}...")
             self.update_status(f"Document types: {', '.join(document_types)}")
-            self.update_status(f"Using {self.max_workers} concurrent workers")
             
-            # Use ThreadPoolExecutor for concurrent downloads
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # Submit all packages for processing
-                futures = {
-                    executor.submit(self._process_package, pkg, document_types, total_packages): pkg 
-                    for pkg in packages
-                }
-                
-                # Process completed futures
-                for future in as_completed(futures):
-                    if self.should_stop:
-                        self.update_status("Stopping workers...", "warning")
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                    
-                    # Exceptions are handled within _process_package
-                    try:
-                        future.result()
-                    except Exception as e:
-                        self._increment_error()
-                        self.update_status(f"Worker error: {e}", "error")
+            writer = PlanWriter(plan_path)
+            try:
+                self._run_packages(packages, lambda pkg: self._plan_package(pkg, document_types, writer, fetch_sizes))
+            finally:
+                writer.close()
             
-            # Final summary
-            if self.should_stop:
-                self.update_status("Download stopped by user", "warning")
+            if self.session_expired:
+                self.update_status("Planning stopped: session expired, plan is incomplete", "warning")
+            elif self.should_stop:
+                self.update_status("Planning stopped by user, plan is incomplete", "warning")
             else:
-                self.update_status("Download completed!")
-            
-            self.update_status(f"Summary: {self.downloaded_files} downloaded, {self.skipped_files} skipped, {self.error_count} errors")
+                self.update_status("Planning completed!")
+            self.update_status(f"Plan: {writer.rows_written} documents, {self.planned_bytes / (1024 * 1024):.1f} MB known size, {self.error_count} errors")
             
             return {
-                "success": True,
-                "downloaded": self.downloaded_files,
-                "skipped": self.skipped_files,
+                "success": not self.session_expired,
+                "documents": writer.rows_written,
+                "bytes": self.planned_bytes,
                 "errors": self.error_count,
-                "total_packages": total_packages
+                "total_packages": total_packages,
+                "by_type": self._plan_summary(read_plan(plan_path)) if writer.rows_written else {},
+                "latency": self._latency_report()
             }
             
+        except Exception as e:
+            self.update_status(f"Planning failed: {e}", "error")
+            return {"success": False, "error": str(e)}
+        finally:
+            self._finish_run()
+    
+    def execute_plan(self, plan_path, session_cookie, document_types=None, start=0, limit=None):
+        """Download the documents listed in a plan written by plan_download.
+        
+        start/limit select a slice of the plan so one plan can be split across
+        several time windows or machines. No dokumencetak requests are sent.
+        """
+        self._start_run(session_cookie)
+        
+        try:
+            rows = read_plan(plan_path)
+            if document_types:
+                rows = [row for row in rows if row["document_type"] in document_types]
+            if self.shard is not None:
+                rows = [row for row in rows if self.shard.contains(row)]
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            if not rows:
+                return {"success": False, "error": "No documents in plan"}
+            
+            job = ["execute", os.path.abspath(plan_path), sorted(document_types or []), start, limit, str(self.shard or "")]
+            rows = self._resume(rows, job, lambda row: row["pdf_url"])
+            
+            total_documents = len(rows)
+            self.update_status(f"Executing plan {plan_path}: {total_documents} documents...")
+            by_type = self._plan_summary(rows)
+            self.update_status(f"Using {self.max_workers} concurrent workers ({self.transport.name})")
+            
+            self._run_packages(rows, lambda row: self.download_document(row["pdf_url"], row, row["document_type"]))
+            
+            result = self._download_summary(total_documents)
+            result["by_type"] = by_type
+            return result
+            
         except Exception as e:
             self.update_status(f"Download failed: {e}", "error")
             return {"success": False, "error": str(e)}
         finally:
-            self.is_downloading = False
+            self._finish_run()
 
 # Test function
 if __name__ == "__main__":
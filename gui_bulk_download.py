@@ -9,15 +9,22 @@ Supports English and Indonesian languages with flag selection.
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, simpledialog, filedialog
 import threading
+import importlib
+import multiprocessing
 import os
 import sys
+import time
+import subprocess
 from datetime import datetime
 
-# Import our custom modules
-from session_validator import SessionValidator
-from enhanced_downloader import EnhancedDownloader
+# Import our custom modules. session_validator and enhanced_downloader pull in
+# requests and bs4, so they are imported after the window is shown (see preload_engine)
+from package_filter import PackageFilter
+
+# Modules loaded in the background once the first frame is drawn
+ENGINE_MODULES = ("session_validator", "enhanced_downloader")
 
 class EPGUIApplication:
     def __init__(self, root):
@@ -26,9 +33,15 @@ class EPGUIApplication:
         self.root.geometry("800x600")
         self.root.resizable(True, True)
         
-        # Initialize components
-        self.validator = SessionValidator()
+        # Initialize components (the validator is built on first use)
+        self.validator = None
+        self._validator_lock = threading.Lock()
+        self.document_index = None
+        # DownloadJobs run together by the next start_download
+        self.job_queue = []
         self.downloader = None
+        # Watcher of a running watch mode session (see watch_mode)
+        self.watcher = None
         self.is_downloading = False
         
         # Language settings (English default)
@@ -84,7 +97,42 @@ class EPGUIApplication:
                 "akte_kelahiran": "Birth Certificate",
                 "kartu_keluarga": "Family Card",
                 "workers": "Concurrent Workers:",
-                "workers_hint": "(1-10, higher = faster but more server load)"
+                "workers_hint": "(1-10, higher = faster but more server load)",
+                "filters": "Filters (optional):",
+                "date_from": "Date from:",
+                "date_to": "to:",
+                "date_hint": "(DD-MM-YYYY)",
+                "status_filter": "Status:",
+                "identifier_filter": "NIK / Package No.:",
+                "invalid_filter": "Invalid filter: {error}",
+                "filter_label": "Filter: {filter}",
+                "live_stats": "Live:",
+                "stats_line": "{pps:.1f} pkg/s | {mbps:.2f} MB/s | {in_flight} in flight | {active} workers busy | {errors:.1f}% errors | ETA {eta}",
+                "stats_idle": "-",
+                "search_documents": "Search Documents",
+                "add_job": "Add Job to Queue",
+                "watch_mode": "Keep watching for new submissions",
+                "refresh_scans": "Rescan all packages",
+                "watch_started": "Watch mode: polling for new submissions until stopped",
+                "watch_finished": "Watch ended after {polls} polls",
+                "clear_jobs": "Clear Queue",
+                "queued_jobs": "Queued jobs: {count}",
+                "choose_job_folder": "Folder for this job's downloads",
+                "job_queued": "Queued {name}: {doc_list} -> {folder}",
+                "invalid_job": "Cannot queue this job: {error}",
+                "confirm_batch": "Run {count} queued jobs in one pass?\n\n{jobs}\n\nEach package is scanned once for all jobs.",
+                "job_result": "{name}: {downloaded} downloaded, {skipped} skipped, {errors} errors",
+                "search_title": "Search Downloaded Documents",
+                "search_hint": "NIK, name or package number:",
+                "search": "Search",
+                "search_result_count": "{count} documents found in {ms:.1f} ms",
+                "column_nomor": "Package No.",
+                "column_nik": "NIK",
+                "column_nama": "Name",
+                "column_type": "Type",
+                "column_path": "File",
+                "session_expired_title": "Session Expired",
+                "session_expired_prompt": "The session expired during the download. All workers are paused.\n\nPaste a new session cookie to resume (Cancel stops the download):"
             },
             "id": {
                 "title": "E-Paket Unduh Massal",
@@ -136,7 +184,42 @@ class EPGUIApplication:
                 "akte_kelahiran": "Akte Kelahiran",
                 "kartu_keluarga": "Kartu Keluarga",
                 "workers": "Pekerja Simultan:",
-                "workers_hint": "(1-10, lebih tinggi = lebih cepat tapi beban server lebih besar)"
+                "workers_hint": "(1-10, lebih tinggi = lebih cepat tapi beban server lebih besar)",
+                "filters": "Filter (opsional):",
+                "date_from": "Tanggal dari:",
+                "date_to": "sampai:",
+                "date_hint": "(HH-BB-TTTT)",
+                "status_filter": "Status:",
+                "identifier_filter": "NIK / No. Paket:",
+                "invalid_filter": "Filter tidak valid: {error}",
+                "filter_label": "Filter: {filter}",
+                "live_stats": "Langsung:",
+                "stats_line": "{pps:.1f} paket/dtk | {mbps:.2f} MB/dtk | {in_flight} permintaan aktif | {active} pekerja sibuk | {errors:.1f}% galat | Estimasi {eta}",
+                "stats_idle": "-",
+                "search_documents": "Cari Dokumen",
+                "add_job": "Tambah ke Antrean",
+                "watch_mode": "Terus pantau pengajuan baru",
+                "refresh_scans": "Pindai ulang semua paket",
+                "watch_started": "Mode pantau: memeriksa pengajuan baru sampai dihentikan",
+                "watch_finished": "Pemantauan berakhir setelah {polls} pemeriksaan",
+                "clear_jobs": "Kosongkan Antrean",
+                "queued_jobs": "Pekerjaan dalam antrean: {count}",
+                "choose_job_folder": "Folder unduhan untuk pekerjaan ini",
+                "job_queued": "{name} masuk antrean: {doc_list} -> {folder}",
+                "invalid_job": "Pekerjaan tidak dapat dimasukkan ke antrean: {error}",
+                "confirm_batch": "Jalankan {count} pekerjaan dalam antrean sekaligus?\n\n{jobs}\n\nSetiap paket dipindai sekali untuk semua pekerjaan.",
+                "job_result": "{name}: {downloaded} diunduh, {skipped} dilewati, {errors} kesalahan",
+                "search_title": "Cari Dokumen yang Diunduh",
+                "search_hint": "NIK, nama atau nomor paket:",
+                "search": "Cari",
+                "search_result_count": "{count} dokumen ditemukan dalam {ms:.1f} md",
+                "column_nomor": "No. Paket",
+                "column_nik": "NIK",
+                "column_nama": "Nama",
+                "column_type": "Jenis",
+                "column_path": "Berkas",
+                "session_expired_title": "Sesi Kedaluwarsa",
+                "session_expired_prompt": "Sesi kedaluwarsa saat mengunduh. Semua pekerja dijeda.\n\nTempelkan cookie sesi baru untuk melanjutkan (Batal menghentikan unduhan):"
             }
         }
         
@@ -151,6 +234,12 @@ class EPGUIApplication:
         self.session_cookie_var = tk.StringVar()
         self.session_valid_var = tk.StringVar(value=self.get_text("not_validated"))
         self.worker_count_var = tk.IntVar(value=5)  # Default 5 concurrent workers
+        self.watch_var = tk.BooleanVar(value=False)
+        self.refresh_scans_var = tk.BooleanVar(value=False)
+        self.date_from_var = tk.StringVar()
+        self.date_to_var = tk.StringVar()
+        self.status_filter_var = tk.StringVar()
+        self.identifier_filter_var = tk.StringVar()
         self.selected_documents = []
         
         self.setup_gui()
@@ -192,13 +281,13 @@ class EPGUIApplication:
         self.create_document_section(main_frame, 4)
         
         # Download Controls Section
-        self.create_download_section(main_frame, 7)
+        self.create_download_section(main_frame, 8)
         
         # Progress Section
-        self.create_progress_section(main_frame, 10)
+        self.create_progress_section(main_frame, 11)
         
         # Status Section
-        self.create_status_section(main_frame, 13)
+        self.create_status_section(main_frame, 15)
         
     def create_language_section(self, parent, start_row):
         """Create language selection section with flag buttons."""
@@ -256,10 +345,24 @@ class EPGUIApplication:
         for doc_key, checkbox in self.checkbox_widgets.items():
             checkbox.config(text=self.get_document_display_name(doc_key))
         
+        # Update filter labels
+        self.filters_label.config(text=self.get_text("filters"))
+        self.date_from_label.config(text=self.get_text("date_from"))
+        self.date_to_label.config(text=self.get_text("date_to"))
+        self.date_hint_label.config(text=self.get_text("date_hint"))
+        self.status_filter_label.config(text=self.get_text("status_filter"))
+        self.identifier_filter_label.config(text=self.get_text("identifier_filter"))
+        
         self.download_section_label.config(text=self.get_text("download_controls"))
         self.start_btn.config(text=self.get_text("start_download"))
         self.stop_btn.config(text=self.get_text("stop_download"))
         self.clear_btn.config(text=self.get_text("clear_status"))
+        self.search_btn.config(text=self.get_text("search_documents"))
+        self.add_job_btn.config(text=self.get_text("add_job"))
+        self.watch_check.config(text=self.get_text("watch_mode"))
+        self.refresh_scans_check.config(text=self.get_text("refresh_scans"))
+        self.clear_jobs_btn.config(text=self.get_text("clear_jobs"))
+        self.update_job_queue_label()
         
         # Update worker labels
         self.workers_label.config(text=self.get_text("workers"))
@@ -268,6 +371,7 @@ class EPGUIApplication:
         self.progress_section_label.config(text=self.get_text("progress_tracking"))
         self.progress_text_label.config(text=self.get_text("progress"))
         self.progress_label.config(text=self.get_text("ready"))
+        self.stats_text_label.config(text=self.get_text("live_stats"))
         
         self.status_section_label.config(text=self.get_text("status_log"))
         
@@ -353,6 +457,32 @@ class EPGUIApplication:
                                       variable=var, command=self.on_document_selection_change)
             checkbox.grid(row=0, column=i, sticky=tk.W, padx=15, pady=5)
             self.checkbox_widgets[doc_key] = checkbox
+        
+        # Optional pre-scan filters on listing fields
+        filter_frame = ttk.Frame(parent)
+        filter_frame.grid(row=start_row+3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 5))
+        filter_frame.columnconfigure(6, weight=1)
+        
+        self.filters_label = ttk.Label(filter_frame, text=self.get_text("filters"), font=("Arial", 9, "bold"))
+        self.filters_label.grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
+        
+        self.date_from_label = ttk.Label(filter_frame, text=self.get_text("date_from"))
+        self.date_from_label.grid(row=0, column=1, sticky=tk.W)
+        ttk.Entry(filter_frame, textvariable=self.date_from_var, width=12).grid(row=0, column=2, padx=(5, 5))
+        self.date_to_label = ttk.Label(filter_frame, text=self.get_text("date_to"))
+        self.date_to_label.grid(row=0, column=3, sticky=tk.W)
+        ttk.Entry(filter_frame, textvariable=self.date_to_var, width=12).grid(row=0, column=4, padx=(5, 5))
+        self.date_hint_label = ttk.Label(filter_frame, text=self.get_text("date_hint"),
+                                         font=("Arial", 8), foreground="gray")
+        self.date_hint_label.grid(row=0, column=5, sticky=tk.W)
+        
+        self.status_filter_label = ttk.Label(filter_frame, text=self.get_text("status_filter"))
+        self.status_filter_label.grid(row=1, column=1, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(filter_frame, textvariable=self.status_filter_var, width=12).grid(row=1, column=2, padx=(5, 5), pady=(5, 0))
+        self.identifier_filter_label = ttk.Label(filter_frame, text=self.get_text("identifier_filter"))
+        self.identifier_filter_label.grid(row=1, column=3, columnspan=2, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(filter_frame, textvariable=self.identifier_filter_var).grid(
+            row=1, column=5, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0), pady=(5, 0))
             
     def create_download_section(self, parent, start_row):
         """Create download controls section."""
@@ -373,9 +503,17 @@ class EPGUIApplication:
                                   command=self.stop_download, state="disabled")
         self.stop_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.add_job_btn = ttk.Button(button_frame, text=self.get_text("add_job"), 
+                                     command=self.add_job)
+        self.add_job_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         self.clear_btn = ttk.Button(button_frame, text=self.get_text("clear_status"), 
                                    command=self.clear_status)
-        self.clear_btn.pack(side=tk.LEFT)
+        self.clear_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.search_btn = ttk.Button(button_frame, text=self.get_text("search_documents"), 
+                                    command=self.open_search_window)
+        self.search_btn.pack(side=tk.LEFT)
         
         # Worker count configuration
         worker_frame = ttk.Frame(parent)
@@ -390,7 +528,24 @@ class EPGUIApplication:
         
         self.workers_hint_label = ttk.Label(worker_frame, text=self.get_text("workers_hint"),
                                            font=("Arial", 8), foreground="gray")
-        self.workers_hint_label.pack(side=tk.LEFT)
+        self.workers_hint_label.pack(side=tk.LEFT, padx=(0, 20))
+        
+        self.watch_check = ttk.Checkbutton(worker_frame, text=self.get_text("watch_mode"), variable=self.watch_var)
+        self.watch_check.pack(side=tk.LEFT, padx=(0, 20))
+        
+        # Ignore cached scans for this run (documents added without a status or date change)
+        self.refresh_scans_check = ttk.Checkbutton(worker_frame, text=self.get_text("refresh_scans"),
+                                                   variable=self.refresh_scans_var)
+        self.refresh_scans_check.pack(side=tk.LEFT, padx=(0, 20))
+        
+        # Jobs queued for one batched run
+        self.job_queue_label = ttk.Label(worker_frame, text="")
+        self.job_queue_label.pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.clear_jobs_btn = ttk.Button(worker_frame, text=self.get_text("clear_jobs"), 
+                                        command=self.clear_jobs, state="disabled")
+        self.clear_jobs_btn.pack(side=tk.LEFT)
+        self.update_job_queue_label()
         
     def create_progress_section(self, parent, start_row):
         """Create progress tracking section."""
@@ -410,6 +565,21 @@ class EPGUIApplication:
         self.progress_label = ttk.Label(parent, text=self.get_text("ready"), foreground="blue")
         self.progress_label.grid(row=start_row+2, column=0, columnspan=3, sticky=tk.W, pady=2)
         
+        # Live throughput: rates and ETA plus a sparkline of recent packages/sec
+        self.stats_text_label = ttk.Label(parent, text=self.get_text("live_stats"))
+        self.stats_text_label.grid(row=start_row+3, column=0, sticky=tk.W, pady=2)
+        
+        stats_frame = ttk.Frame(parent)
+        stats_frame.grid(row=start_row+3, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=2)
+        stats_frame.columnconfigure(1, weight=1)
+        
+        self.stats_canvas = tk.Canvas(stats_frame, width=120, height=24, background="white",
+                                      highlightthickness=1, highlightbackground="gray")
+        self.stats_canvas.grid(row=0, column=0, padx=(0, 10))
+        
+        self.stats_label = ttk.Label(stats_frame, text=self.get_text("stats_idle"))
+        self.stats_label.grid(row=0, column=1, sticky=tk.W)
+        
     def create_status_section(self, parent, start_row):
         """Create status display section."""
         # Section title
@@ -433,13 +603,33 @@ class EPGUIApplication:
     def update_start_button_state(self):
         """Update the start button state based on validation and selection."""
         session_valid = "✓" in self.session_valid_var.get()
-        has_documents = len(self.selected_documents) > 0
+        has_documents = len(self.selected_documents) > 0 or len(self.job_queue) > 0
         
         if session_valid and has_documents and not self.is_downloading:
             self.start_btn.config(state="normal")
         else:
             self.start_btn.config(state="disabled")
             
+    def preload_engine(self):
+        """Import the networking/parsing stack on a background thread after first paint."""
+        def preload():
+            for name in ENGINE_MODULES:
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    # Reported again, with context, when the module is actually used
+                    print(f"Background import of {name} failed: {e}")
+        
+        threading.Thread(target=preload, name="EnginePreload", daemon=True).start()
+        
+    def get_validator(self):
+        """Session validator, created on first use."""
+        with self._validator_lock:
+            if self.validator is None:
+                from session_validator import SessionValidator
+                self.validator = SessionValidator()
+            return self.validator
+        
     def validate_session(self):
         """Validate the session cookie."""
         session_cookie = self.session_cookie_var.get().strip()
@@ -454,7 +644,7 @@ class EPGUIApplication:
         
         def validate_thread():
             try:
-                is_valid, message = self.validator.validate_session(session_cookie)
+                is_valid, message = self.get_validator().validate_session(session_cookie)
                 
                 # Update GUI in main thread
                 self.root.after(0, lambda: self.update_session_validation(is_valid, message))
@@ -478,6 +668,57 @@ class EPGUIApplication:
             
         self.update_start_button_state()
         
+    def read_package_filter(self):
+        """PackageFilter from the filter fields, or None (after a warning) when they are invalid."""
+        try:
+            return PackageFilter.from_text(
+                self.date_from_var.get(), self.date_to_var.get(),
+                self.status_filter_var.get(), self.identifier_filter_var.get())
+        except ValueError as e:
+            messagebox.showwarning(self.get_text("warning"), self.get_text("invalid_filter").format(error=e))
+            return None
+        
+    def add_job(self):
+        """Queue the current document selection and filter, with its own folder, for a batched run."""
+        if not self.selected_documents:
+            messagebox.showwarning(self.get_text("warning"), self.get_text("select_one_doc"))
+            return
+        package_filter = self.read_package_filter()
+        if package_filter is None:
+            return
+        folder = filedialog.askdirectory(title=self.get_text("choose_job_folder"), initialdir=os.getcwd(),
+                                         mustexist=False)
+        if not folder:
+            return
+        
+        from download_jobs import DownloadJob, check_jobs
+        from output_backends import FolderOutput
+        job = DownloadJob(f"job{len(self.job_queue) + 1}", list(self.selected_documents), package_filter,
+                          FolderOutput(folder))
+        try:
+            check_jobs(self.job_queue + [job])
+        except ValueError as e:
+            messagebox.showwarning(self.get_text("warning"), self.get_text("invalid_job").format(error=e))
+            return
+        self.job_queue.append(job)
+        
+        doc_list = ", ".join(job.document_types)
+        self.log_status(self.get_text("job_queued").format(name=job.name, doc_list=doc_list, folder=folder), "info")
+        if job.package_filter is not None:
+            self.log_status(self.get_text("filter_label").format(filter=job.package_filter.describe()), "info")
+        self.update_job_queue_label()
+        self.update_start_button_state()
+        
+    def clear_jobs(self):
+        """Empty the job queue."""
+        self.job_queue = []
+        self.update_job_queue_label()
+        self.update_start_button_state()
+        
+    def update_job_queue_label(self):
+        self.job_queue_label.config(text=self.get_text("queued_jobs").format(count=len(self.job_queue)))
+        self.clear_jobs_btn.config(state="normal" if self.job_queue and not self.is_downloading else "disabled")
+        
     def start_download(self):
         """Start the bulk download process."""
         session_cookie = self.session_cookie_var.get().strip()
@@ -485,10 +726,18 @@ class EPGUIApplication:
         if not session_cookie:
             messagebox.showwarning(self.get_text("warning"), self.get_text("enter_session"))
             return
+        
+        if self.job_queue:
+            self.start_batch(session_cookie)
+            return
             
         if not self.selected_documents:
             messagebox.showwarning(self.get_text("warning"), self.get_text("select_one_doc"))
             return
+        
+        package_filter = self.read_package_filter()
+        if package_filter is None:
+            return
             
         # Confirm download
         doc_list = ", ".join([k.replace("_", " ") for k in self.selected_documents])
@@ -507,27 +756,81 @@ class EPGUIApplication:
             
         self.log_status(self.get_text("starting_download"), "info")
         self.log_status(self.get_text("document_types_label").format(doc_list=doc_list), "info")
+        if package_filter.is_active():
+            self.log_status(self.get_text("filter_label").format(filter=package_filter.describe()), "info")
+        
+        if self.watch_var.get():
+            self.log_status(self.get_text("watch_started"), "info")
+            self.run_download(lambda: self.run_watch(list(self.selected_documents), session_cookie, package_filter))
+        else:
+            self.run_download(lambda: self.downloader.bulk_download(self.selected_documents, session_cookie, package_filter))
+        
+    def run_watch(self, document_types, session_cookie, package_filter):
+        """Keep the engine warm and download new submissions until Stop is pressed (download thread)."""
+        from watch_mode import Watcher
+        self.watcher = Watcher(self.downloader, document_types, session_cookie, package_filter)
+        try:
+            result = self.watcher.run()
+        finally:
+            self.watcher = None
+        self.root.after(0, lambda: self.log_status(self.get_text("watch_finished").format(polls=result["polls"]), "info"))
+        return result
+        
+    def start_batch(self, session_cookie):
+        """Run the queued jobs in one pass: one listing fetch, one scan per package."""
+        jobs = self.job_queue
+        job_lines = "\n".join(f"{job.name}: {', '.join(job.document_types)} -> {job.output.root}" for job in jobs)
+        confirm_msg = self.get_text("confirm_batch").format(count=len(jobs), jobs=job_lines)
+        if not messagebox.askyesno(self.get_text("confirm"), confirm_msg):
+            return
         
+        self.is_downloading = True
+        self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.validate_btn.config(state="disabled")
+        self.job_queue = []
+        self.update_job_queue_label()
+        
+        self.log_status(self.get_text("starting_download"), "info")
+        self.run_download(lambda: self.downloader.download_jobs(jobs, session_cookie))
+        
+    def run_download(self, run):
+        """Create the downloader and call run() on a background thread."""
         # Start download in separate thread
         worker_count = self.worker_count_var.get()
-        self.downloader = EnhancedDownloader(max_workers=worker_count)
-        self.downloader.set_callbacks(self.update_progress, self.log_status)
+        from enhanced_downloader import EnhancedDownloader
+        from document_index import DOCUMENT_INDEX_NAME
+        from scan_cache import SCAN_CACHE_NAME
+        # Cached scans let a later run with other document types skip the dokumencetak requests;
+        # "Rescan all packages" POSTs for every package and refreshes the cache
+        scan_mode = "refresh" if self.refresh_scans_var.get() else "auto"
+        self.downloader = EnhancedDownloader(max_workers=worker_count, scan_cache=SCAN_CACHE_NAME,
+                                             scan_mode=scan_mode, document_index=DOCUMENT_INDEX_NAME)
+        self.downloader.set_callbacks(self.update_progress, self.log_status, self.on_stats, self.ask_new_session)
+        
+        downloader = self.downloader
         
         def download_thread():
             try:
-                result = self.downloader.bulk_download(self.selected_documents, session_cookie)
+                result = run()
                 
                 # Update GUI in main thread
                 self.root.after(0, lambda: self.download_completed(result))
                 
             except Exception as e:
                 self.root.after(0, lambda: self.download_error(str(e)))
+            finally:
+                # Every run opens its own cache and index connections
+                downloader.close()
         
         threading.Thread(target=download_thread, daemon=True).start()
         
     def stop_download(self):
         """Stop the download process."""
-        if self.downloader:
+        if self.watcher:
+            self.watcher.stop()
+            self.log_status(self.get_text("stopping_download"), "warning")
+        elif self.downloader:
             self.downloader.stop_download()
             self.log_status(self.get_text("stopping_download"), "warning")
             
@@ -543,6 +846,8 @@ class EPGUIApplication:
             self.log_status(f"{self.get_text('downloaded')}: {result['downloaded']} {self.get_text('files')}", "info")
             self.log_status(f"{self.get_text('skipped')}: {result['skipped']} {self.get_text('files')}", "info")
             self.log_status(f"{self.get_text('errors')}: {result['errors']} {self.get_text('files')}", "info")
+            for name, counts in result.get("jobs", {}).items():
+                self.log_status(self.get_text("job_result").format(name=name, **counts), "info")
             
             messagebox.showinfo(self.get_text("success"), 
                               f"{self.get_text('download_completed')}\n\n"
@@ -554,6 +859,7 @@ class EPGUIApplication:
             self.log_status(self.get_text("download_failed").format(error=error_msg), "error")
             messagebox.showerror(self.get_text("error"), self.get_text("download_failed").format(error=error_msg))
             
+        self.update_job_queue_label()
         self.update_start_button_state()
         
     def download_error(self, error_msg):
@@ -566,6 +872,7 @@ class EPGUIApplication:
         self.log_status(self.get_text("download_error").format(error=error_msg), "error")
         messagebox.showerror(self.get_text("error"), self.get_text("download_error").format(error=error_msg))
         
+        self.update_job_queue_label()
         self.update_start_button_state()
         
     def update_progress(self, current, total, percentage, message):
@@ -576,6 +883,122 @@ class EPGUIApplication:
         progress_text = f"{current}/{total} ({percentage:.1f}%) - {message}"
         self.progress_label.config(text=progress_text)
         
+    def open_search_window(self):
+        """Search saved documents by NIK, name or package number."""
+        from document_index import DOCUMENT_INDEX_NAME, DocumentIndex
+        from integrity import load_manifests
+        
+        if self.document_index is None:
+            is_new = not os.path.exists(DOCUMENT_INDEX_NAME)
+            self.document_index = DocumentIndex(DOCUMENT_INDEX_NAME)
+            if is_new:
+                # Documents saved before the index existed
+                self.document_index.rebuild(load_manifests().values())
+        
+        window = tk.Toplevel(self.root)
+        window.title(self.get_text("search_title"))
+        window.geometry("900x400")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(1, weight=1)
+        
+        query_frame = ttk.Frame(window, padding="10")
+        query_frame.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        query_frame.columnconfigure(1, weight=1)
+        ttk.Label(query_frame, text=self.get_text("search_hint")).grid(row=0, column=0, padx=(0, 5))
+        query_var = tk.StringVar()
+        query_entry = ttk.Entry(query_frame, textvariable=query_var)
+        query_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 5))
+        
+        columns = ("nomor", "nik", "nama", "type", "path")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, width in zip(columns, (120, 140, 180, 120, 320)):
+            tree.heading(column, text=self.get_text(f"column_{column}"))
+            tree.column(column, width=width)
+        tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=10)
+        
+        result_label = ttk.Label(window, text="", foreground="gray")
+        result_label.grid(row=2, column=0, sticky=tk.W, padx=10, pady=5)
+        
+        def search(event=None):
+            start = time.perf_counter()
+            results = self.document_index.search(query_var.get())
+            elapsed = (time.perf_counter() - start) * 1000
+            tree.delete(*tree.get_children())
+            for result in results:
+                tree.insert("", tk.END, values=(result["nomor"] or "", result["nik"] or "", result["nama"] or "",
+                                                result["document_type"], result["path"] or result["location"]))
+            result_label.config(text=self.get_text("search_result_count").format(count=len(results), ms=elapsed))
+        
+        def open_selected(event=None):
+            selection = tree.selection()
+            if not selection:
+                return
+            path = tree.item(selection[0], "values")[4]
+            if not os.path.isfile(path):
+                return
+            if sys.platform == "win32":
+                os.startfile(path)
+            else:
+                subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
+        
+        ttk.Button(query_frame, text=self.get_text("search"), command=search).grid(row=0, column=2)
+        query_entry.bind("<Return>", search)
+        tree.bind("<Double-1>", open_selected)
+        query_entry.focus_set()
+        
+    def ask_new_session(self):
+        """Session renewal callback: ask on the Tk thread while the worker waits."""
+        answer = {}
+        done = threading.Event()
+        
+        def ask():
+            try:
+                answer["cookie"] = simpledialog.askstring(self.get_text("session_expired_title"),
+                                                          self.get_text("session_expired_prompt"), parent=self.root)
+            finally:
+                done.set()
+        
+        self.root.after(0, ask)
+        done.wait()
+        cookie = (answer.get("cookie") or "").strip()
+        if cookie:
+            # Keep the field current so the next run uses the new cookie
+            self.root.after(0, lambda: self.session_cookie_var.set(cookie))
+        return cookie or None
+        
+    def on_stats(self, snapshot):
+        """Stats callback, called from the downloader's ticker thread."""
+        self.root.after(0, lambda: self.update_stats(snapshot))
+        
+    def update_stats(self, snapshot):
+        """Show the live throughput snapshot and redraw the sparkline."""
+        eta = snapshot["eta_seconds"]
+        if eta is None:
+            eta_text = "--:--"
+        else:
+            minutes, seconds = divmod(int(eta), 60)
+            hours, minutes = divmod(minutes, 60)
+            eta_text = f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+        
+        self.stats_label.config(text=self.get_text("stats_line").format(
+            pps=snapshot["packages_per_sec"], mbps=snapshot["mb_per_sec"],
+            in_flight=snapshot["in_flight"], active=snapshot["active_workers"],
+            errors=snapshot["error_rate"] * 100, eta=eta_text))
+        
+        # Sparkline scaled to the highest rate in the history
+        self.stats_canvas.delete("all")
+        history = snapshot["history"]
+        if len(history) < 2:
+            return
+        width = int(self.stats_canvas["width"])
+        height = int(self.stats_canvas["height"])
+        peak = max(history) or 1.0
+        step = width / (len(history) - 1)
+        points = []
+        for i, value in enumerate(history):
+            points.extend((i * step, height - 2 - (value / peak) * (height - 4)))
+        self.stats_canvas.create_line(*points, fill="blue")
+        
     def log_status(self, message, level="info"):
         """Add message to status log."""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -618,6 +1041,8 @@ class EPGUIApplication:
         # Reset progress
         self.progress_bar['value'] = 0
         self.progress_label.config(text="Ready")
+        self.stats_label.config(text=self.get_text("stats_idle"))
+        self.stats_canvas.delete("all")
 
 def main():
     """Main function to run the GUI application."""
@@ -630,7 +1055,11 @@ def main():
     y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
     root.geometry(f"+{x}+{y}")
     
+    # Load requests/bs4 once the window is up instead of before it is drawn
+    root.after_idle(app.preload_engine)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed for the parse process pool in frozen Windows builds
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Download manifest and integrity verification for saved documents.
+Every document the downloader saves is recorded in download_manifest.jsonl (URL, size,
+SHA-256). verify_downloads checks the *_Downloads folders and archive shards against it in
+parallel and reports the files that need to be fetched again.
+"""
+
+import os
+import glob
+import json
+import time
+import tarfile
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = "download_manifest.jsonl"
+
+# A PDF header may be preceded by a little junk, the EOF marker followed by a little
+_HEADER_WINDOW = 1024
+_TRAILER_WINDOW = 2048
+
+
+class DownloadManifest:
+    """Append-only JSON-lines record of saved documents, keyed by stored location."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        """Append one entry (location, type, filename, url, size, sha256, ...)."""
+        entry = dict(entry, saved=time.strftime("%Y-%m-%d %H:%M:%S"))
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def load(self):
+        """Latest entry per location."""
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave a half-written last line
+                    continue
+                entries[os.path.normpath(entry["location"])] = entry
+        return entries
+
+
+def load_manifests(root="."):
+    """Latest entry per location over every manifest in root.
+
+    Shards sharing an output folder each write their own
+    download_manifest.shard-i-of-N.jsonl next to download_manifest.jsonl.
+    """
+    entries = {}
+    for path in sorted(glob.glob(os.path.join(root, "download_manifest*.jsonl"))):
+        for key, entry in DownloadManifest(path).load().items():
+            if key not in entries or entry.get("saved", "") >= entries[key].get("saved", ""):
+                entries[key] = entry
+    return entries
+
+
+class ContentIndex:
+    """SHA-256 -> location of the first saved copy, for storing identical PDFs once."""
+
+    def __init__(self, entries=()):
+        self._lock = threading.Lock()
+        self._locations = {}
+        for entry in entries:
+            if entry.get("sha256") and not entry.get("duplicate_of"):
+                self._locations.setdefault((entry["sha256"], entry.get("size")), entry["location"])
+
+    @classmethod
+    def from_manifest(cls, manifest):
+        return cls(manifest.load().values())
+
+    def lookup(self, sha256, size):
+        """Location of a saved document with this content, or None."""
+        with self._lock:
+            return self._locations.get((sha256, size))
+
+    def add(self, sha256, size, location):
+        with self._lock:
+            self._locations.setdefault((sha256, size), location)
+
+    def replace(self, sha256, size, location):
+        """Make location the copy later duplicates link to."""
+        with self._lock:
+            self._locations[(sha256, size)] = location
+
+    def __len__(self):
+        return len(self._locations)
+
+
+def _check_content(f, size, result, expected_size=None, expected_sha256=None):
+    """Hash a PDF read front to back from f and fill in result's sha256 and problem."""
+    digest = hashlib.sha256()
+    head = f.read(_HEADER_WINDOW)
+    digest.update(head)
+    tail = head[-_TRAILER_WINDOW:]
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(chunk)
+        # Archive members cannot always seek, so the trailer is kept while reading
+        tail = (tail + chunk)[-_TRAILER_WINDOW:]
+    result["sha256"] = digest.hexdigest()
+
+    if size == 0:
+        result["problem"] = "empty file"
+    elif b"%PDF-" not in head:
+        result["problem"] = "missing %PDF- header"
+    elif b"%%EOF" not in tail:
+        result["problem"] = "missing %%EOF (truncated)"
+    elif expected_size is not None and size != expected_size:
+        result["problem"] = f"size {size} != expected {expected_size}"
+    elif expected_sha256 and result["sha256"] != expected_sha256:
+        result["problem"] = "checksum mismatch"
+    return result
+
+
+def check_pdf(path, expected_size=None, expected_sha256=None):
+    """Check PDF structure, size and checksum of one file.
+
+    Returns a dict with size, sha256 and problem (None when the file is good).
+    """
+    result = {"path": path, "size": None, "sha256": None, "problem": None}
+    try:
+        size = os.path.getsize(path)
+        result["size"] = size
+        with open(path, 'rb') as f:
+            return _check_content(f, size, result, expected_size, expected_sha256)
+    except OSError as e:
+        result["problem"] = f"unreadable: {e}"
+        return result
+
+
+def _archive_members(root):
+    """{shard name: [index entry]} of the documents stored in root's archive shards (aliases excluded)."""
+    members = {}
+    for index_path in sorted(glob.glob(os.path.join(root, "*_index.jsonl"))):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "shard" in entry and "member" in entry and not entry.get("alias"):
+                    members.setdefault(entry["shard"], {})[entry["member"]] = entry
+    return {shard: list(entries.values()) for shard, entries in members.items()}
+
+
+def _check_shard(root, shard, entries, manifest):
+    """Check every stored member of one archive shard against its index and manifest entries."""
+    results = []
+    path = os.path.join(root, shard)
+    try:
+        if shard.endswith(".zip"):
+            archive = zipfile.ZipFile(path)
+            open_member = archive.open
+        else:
+            archive = tarfile.open(path)
+            open_member = archive.extractfile
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        for entry in entries:
+            result = _archive_result(entry, manifest)
+            result["problem"] = f"unreadable shard: {e}"
+            results.append(result)
+        return results
+
+    with archive:
+        for entry in entries:
+            result = _archive_result(entry, manifest)
+            expected = manifest.get(result["path"], {})
+            try:
+                if isinstance(archive, zipfile.ZipFile):
+                    size = archive.getinfo(entry["member"]).file_size
+                else:
+                    size = archive.getmember(entry["member"]).size
+                result["size"] = size
+                with open_member(entry["member"]) as f:
+                    _check_content(f, size, result, expected.get("size", entry.get("size")),
+                                   expected.get("sha256") or entry.get("sha256"))
+            except (KeyError, OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+                result["problem"] = f"unreadable member: {e}"
+            results.append(result)
+    return results
+
+
+def _archive_result(entry, manifest):
+    location = f"{entry['shard']}:{entry['member']}"
+    result = {"path": location, "size": None, "sha256": None, "problem": None, "archive": True}
+    _add_manifest_fields(result, manifest.get(location, {}), entry.get("type"))
+    return result
+
+
+def _add_manifest_fields(result, entry, document_type):
+    """URL, document type and package fields of a checked file, from its manifest entry."""
+    result["url"] = entry.get("url")
+    result["document_type"] = entry.get("document_type") or document_type
+    for key in ("nomor", "nama", "nik", "kode_paket"):
+        result[key] = entry.get(key)
+    result["in_manifest"] = bool(entry)
+
+
+def verify_downloads(root=".", workers=8, progress_callback=None):
+    """Verify every PDF in root/*_Downloads and root's archive shards in parallel.
+
+    Returns a report dict: checked/ok counts, the bad files (with the URL and
+    package fields to fetch them again when the manifest knows them), leftover
+    .part files, and the SHA-256 of every good file. Archive members are
+    checked against the size and SHA-256 in the archive index; their path is
+    "shard:member" and they carry archive=True.
+    """
+    manifest = load_manifests(root)
+
+    files = []
+    partials = []
+    for folder in sorted(glob.glob(os.path.join(root, "*_Downloads"))):
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name.endswith(".part"):
+                partials.append(path)
+            elif os.path.isfile(path):
+                files.append(path)
+    shards = _archive_members(root)
+
+    def check(path):
+        # Manifest locations are relative to the output root
+        entry = manifest.get(os.path.normpath(os.path.relpath(path, root)), {})
+        result = check_pdf(path, entry.get("size"), entry.get("sha256"))
+        folder = os.path.basename(os.path.dirname(path))
+        _add_manifest_fields(result, entry, folder[:-len("_Downloads")].replace("_", " "))
+        return [result]
+
+    report = {"root": root, "checked": 0, "ok": 0, "bad": [], "partials": partials, "checksums": {}}
+    total = len(files) + sum(len(entries) for entries in shards.values())
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(check, path) for path in files]
+        # A shard is read front to back by one worker
+        futures += [executor.submit(_check_shard, root, shard, entries, manifest)
+                    for shard, entries in sorted(shards.items())]
+        for future in futures:
+            for result in future.result():
+                report["checked"] += 1
+                if result["problem"]:
+                    report["bad"].append(result)
+                else:
+                    report["ok"] += 1
+                    report["checksums"][result["path"]] = result["sha256"]
+                if progress_callback:
+                    progress_callback(report["checked"], total, os.path.basename(result["path"]))
+    return report
+
+
+def quarantine(path, root="."):
+    """Move a bad file into root/_quarantine so it is re-downloaded but not lost."""
+    folder = os.path.join(root, "_quarantine", os.path.basename(os.path.dirname(path)))
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    os.replace(path, target)
+    return target
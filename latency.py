@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Per-endpoint latency tracking and straggler deadlines.
+Each endpoint (listing, scan, download) keeps its recent latencies; once enough requests
+have been seen, a request slower than a multiple of the recent percentile is a straggler.
+The downloader defers stragglers to the end of the run instead of letting a few slow
+responses hold workers, and reports tail latency figures in the summary.
+"""
+
+import random
+import threading
+from collections import deque
+
+
+class Straggler(Exception):
+    """A request exceeded its endpoint's deadline; the work is retried at the end of the run."""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class LatencyTracker:
+    """Recent and run-wide request latencies per endpoint.
+
+    The deadline of an endpoint is factor x the percentile of its last window
+    requests, never below floor seconds, and there is none before min_samples
+    requests. Summary figures come from a uniform sample of the whole run.
+    """
+
+    def __init__(self, pct=95, factor=3.0, floor=2.0, min_samples=20, window=500, sample_size=10000):
+        self.pct = pct
+        self.factor = factor
+        self.floor = floor
+        self.min_samples = min_samples
+        self.window = window
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.reset()
+
+    def reset(self):
+        """Forget everything, e.g. at the start of a run."""
+        with self._lock:
+            self._recent = {}
+            self._samples = {}
+            self._counts = {}
+            self._max = {}
+            self._deadlines = {}
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            recent = self._recent.get(endpoint)
+            if recent is None:
+                recent = self._recent[endpoint] = deque(maxlen=self.window)
+                self._samples[endpoint] = []
+                self._counts[endpoint] = 0
+                self._max[endpoint] = 0.0
+            recent.append(seconds)
+            count = self._counts[endpoint] = self._counts[endpoint] + 1
+            self._max[endpoint] = max(self._max[endpoint], seconds)
+
+            # Reservoir sample, so the tail figures cover the whole run in bounded memory
+            sample = self._samples[endpoint]
+            if len(sample) < self.sample_size:
+                sample.append(seconds)
+            else:
+                slot = self._random.randrange(count)
+                if slot < self.sample_size:
+                    sample[slot] = seconds
+
+            # Every 10th request is often enough to follow the server and keeps sorting off the hot path
+            if count >= self.min_samples and (count - self.min_samples) % 10 == 0:
+                threshold = self.factor * percentile(sorted(recent), self.pct)
+                self._deadlines[endpoint] = max(self.floor, threshold)
+
+    def deadline(self, endpoint):
+        """Seconds after which a request to endpoint is a straggler, or None."""
+        return self._deadlines.get(endpoint)
+
+    def summary(self):
+        """{endpoint: {requests, p50_ms, p90_ms, p99_ms, max_ms, deadline_ms}}."""
+        with self._lock:
+            report = {}
+            for endpoint, sample in self._samples.items():
+                values = sorted(sample)
+                deadline = self._deadlines.get(endpoint)
+                report[endpoint] = {
+                    "requests": self._counts[endpoint],
+                    "p50_ms": round(percentile(values, 50) * 1000, 1),
+                    "p90_ms": round(percentile(values, 90) * 1000, 1),
+                    "p99_ms": round(percentile(values, 99) * 1000, 1),
+                    "max_ms": round(self._max[endpoint] * 1000, 1),
+                    "deadline_ms": round(deadline * 1000, 1) if deadline is not None else None,
+                }
+            return report
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Output backends for the enhanced downloader.
+FolderOutput keeps the classic {TYPE}_Downloads folder layout, ArchiveOutput streams
+documents into rolling ZIP/tar shards with a JSON-lines index of their contents.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import tarfile
+import zipfile
+import tempfile
+import threading
+
+
+def type_folder_name(document_type):
+    """Folder (or archive directory) name used for a document type."""
+    return f"{document_type.replace(' ', '_')}_Downloads"
+
+
+# Linux ioctl that makes dst share src's blocks (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """Copy-on-write clone of src at dst, raises OSError where unsupported."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform") from None
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+
+
+def link_file(src, dst):
+    """Link dst to the content of src: hardlink, else reflink. Returns the method or None."""
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        _reflink(src, dst)
+        return "reflink"
+    except OSError:
+        return None
+
+
+class _FolderWriter:
+    """Writes a single file next to its final path and renames it on commit."""
+
+    def __init__(self, filepath, location, root="."):
+        self.filepath = filepath
+        # Path relative to the output root, as recorded in the download manifest
+        self.location = location
+        self.root = root
+        self.part_path = f"{filepath}.part"
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(self.part_path, 'wb')
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.part_path, self.filepath)
+        return self.location
+
+    def commit_duplicate(self, original):
+        """Store the document as a link to an identical saved one (location relative to the root).
+
+        Returns (location, link method), the method is None when the filesystem
+        allows no link and the document was saved as a copy after all.
+        """
+        self._file.close()
+        source = os.path.join(self.root, original)
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+        method = None
+        if os.path.isfile(source) and os.path.getsize(source) == self.size:
+            method = link_file(source, self.filepath)
+        if method is None:
+            os.replace(self.part_path, self.filepath)
+        else:
+            os.remove(self.part_path)
+        return self.location, method
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class FolderOutput:
+    """Save each document as its own file inside a per-type folder."""
+
+    def __init__(self, root="."):
+        self.root = root
+
+    def folder_for(self, document_type):
+        """Get the folder for a document type, creating it if needed."""
+        folder = os.path.join(self.root, type_folder_name(document_type))
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def location(self, document_type, filename):
+        """Path the document is (or would be) stored at."""
+        return os.path.join(self.root, type_folder_name(document_type), filename)
+
+    def exists(self, document_type, filename):
+        """Check if a document was already saved."""
+        return os.path.exists(self.location(document_type, filename))
+
+    def open(self, document_type, filename):
+        """Open a writer for a new document."""
+        return _FolderWriter(os.path.join(self.folder_for(document_type), filename),
+                             os.path.join(type_folder_name(document_type), filename), self.root)
+
+    def close(self):
+        """Nothing to finalize for plain folders."""
+        pass
+
+
+class _ArchiveWriter:
+    """Buffers one document and hands it to the archive on commit."""
+
+    # Small PDFs stay in memory, larger ones spill to a temp file
+    SPOOL_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, output, document_type, filename):
+        self.output = output
+        self.document_type = document_type
+        self.filename = filename
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, chunk):
+        self._buffer.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        try:
+            self._buffer.seek(0)
+            return self.output._add_member(self.document_type, self.filename, self._buffer, self.size, self.sha256)
+        finally:
+            self._buffer.close()
+
+    def commit_duplicate(self, original):
+        """Index the document as another name for an identical stored member ("shard:member")."""
+        try:
+            location = self.output._add_alias(self.document_type, self.filename, original, self.size, self.sha256)
+            if location is not None:
+                return location, "alias"
+            self._buffer.seek(0)
+            return self.output._add_member(self.document_type, self.filename, self._buffer,
+                                           self.size, self.sha256), None
+        finally:
+            self._buffer.close()
+
+    def abort(self):
+        self._buffer.close()
+
+
+class ArchiveOutput:
+    """Stream documents into rolling ZIP or tar shards.
+
+    A shard is closed and a new one started once it reaches max_bytes or
+    max_files. Every member is recorded in {prefix}_index.jsonl, which is also
+    what duplicate detection queries instead of the filesystem. Index lines are
+    written when a shard is finalized, so the index only ever lists members of
+    complete, readable shards.
+    """
+
+    FORMATS = ("zip", "tar")
+
+    def __init__(self, root=".", fmt="zip", max_bytes=1024 * 1024 * 1024, max_files=10000, prefix="epaket"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported archive format: {fmt}")
+        self.root = root
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.prefix = prefix
+        self.index_path = os.path.join(root, f"{prefix}_index.jsonl")
+
+        self._lock = threading.Lock()
+        self._archive = None
+        self._shard_name = None
+        self._shard_bytes = 0
+        # Members stored in the open shard; aliases in _shard_entries take no space
+        self._shard_files = 0
+        self._shard_entries = []
+        self._members = {}
+
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+        self._next_shard = self._find_next_shard()
+
+    def _load_index(self):
+        """Load the contents index of previously finalized shards."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._members[(entry["type"], entry["filename"])] = entry
+
+    def _find_next_shard(self):
+        """Never reopen an existing shard; continue numbering after the last one."""
+        pattern = re.compile(rf"^{re.escape(self.prefix)}_(\d+)\.{self.fmt}$")
+        numbers = [int(m.group(1)) for m in map(pattern.match, os.listdir(self.root)) if m]
+        return max(numbers, default=0) + 1
+
+    def _open_shard(self):
+        self._shard_name = f"{self.prefix}_{self._next_shard:05d}.{self.fmt}"
+        self._next_shard += 1
+        path = os.path.join(self.root, self._shard_name)
+        if self.fmt == "zip":
+            # PDFs are already compressed, storing them is faster and barely larger
+            self._archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self._archive = tarfile.open(path, 'w')
+        self._shard_bytes = 0
+        self._shard_files = 0
+        self._shard_entries = []
+
+    def _finalize_shard(self):
+        """Close the current shard and append its members to the index."""
+        if self._archive is None:
+            return
+        self._archive.close()
+        self._archive = None
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            for entry in self._shard_entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._shard_entries = []
+
+    def _add_member(self, document_type, filename, fileobj, size, sha256=None):
+        """Copy a buffered document into the current shard (called by writers)."""
+        member = f"{type_folder_name(document_type)}/{filename}"
+        with self._lock:
+            if self._archive is not None and (
+                self._shard_bytes + size > self.max_bytes or self._shard_files >= self.max_files
+            ):
+                self._finalize_shard()
+            if self._archive is None:
+                self._open_shard()
+
+            if self.fmt == "zip":
+                with self._archive.open(member, 'w', force_zip64=size > 0x7FFFFFFF) as dest:
+                    while True:
+                        chunk = fileobj.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+            else:
+                info = tarfile.TarInfo(member)
+                info.size = size
+                info.mtime = int(time.time())
+                self._archive.addfile(info, fileobj)
+
+            entry = {
+                "shard": self._shard_name,
+                "member": member,
+                "type": document_type,
+                "filename": filename,
+                "size": size,
+                "sha256": sha256,
+                "added": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._shard_entries.append(entry)
+            self._members[(document_type, filename)] = entry
+            self._shard_bytes += size
+            self._shard_files += 1
+            return f"{self._shard_name}:{member}"
+
+    def _add_alias(self, document_type, filename, original, size, sha256):
+        """Point an index entry at an already stored member instead of storing it again.
+
+        Returns the alias's own "shard:member" name, which keeps manifest
+        locations unique; reading it goes through the index to the original.
+        """
+        shard, _, member = original.partition(":")
+        entry = {
+            "shard": shard,
+            "member": member,
+            "type": document_type,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256,
+            "added": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "alias": True,
+        }
+        with self._lock:
+            if shard != self._shard_name and not os.path.exists(os.path.join(self.root, shard)):
+                return None
+            self._members[(document_type, filename)] = entry
+            if shard == self._shard_name:
+                # Listed once the shard holding the member is complete
+                self._shard_entries.append(entry)
+            else:
+                with open(self.index_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return f"{shard}:{type_folder_name(document_type)}/{filename}"
+
+    def location(self, document_type, filename):
+        """Shard and member name of a stored document, or None."""
+        entry = self._members.get((document_type, filename))
+        if entry:
+            return f"{entry['shard']}:{entry['member']}"
+        return None
+
+    def exists(self, document_type, filename):
+        """Check the contents index for a document."""
+        with self._lock:
+            return (document_type, filename) in self._members
+
+    def open(self, document_type, filename):
+        """Open a writer for a new document."""
+        return _ArchiveWriter(self, document_type, filename)
+
+    def read(self, document_type, filename):
+        """Read a stored document back from its shard."""
+        entry = self._members.get((document_type, filename))
+        if not entry:
+            return None
+        path = os.path.join(self.root, entry["shard"])
+        if self.fmt == "zip":
+            with zipfile.ZipFile(path) as archive:
+                return archive.read(entry["member"])
+        with tarfile.open(path) as archive:
+            return archive.extractfile(entry["member"]).read()
+
+    def close(self):
+        """Finalize the open shard. A later write starts a new shard."""
+        with self._lock:
+            self._finalize_shard()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Pre-scan package filtering for the enhanced downloader.
+Uses the status and date columns the listing already returns, so packages that cannot
+hold a wanted document never cost a dokumencetak round-trip.
+"""
+
+import re
+import html
+from datetime import date
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACE_RE = re.compile(r'\s+')
+_DATE_RE = re.compile(r'(\d{1,4})[-/.](\d{1,2})[-/.](\d{1,4})')
+_NAMED_DATE_RE = re.compile(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})')
+
+# Indonesian and English month names (first three letters)
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "mei": 5, "may": 5, "jun": 6, "jul": 7,
+    "agu": 8, "agt": 8, "aug": 8, "sep": 9, "okt": 10, "oct": 10, "nov": 11, "des": 12, "dec": 12,
+}
+
+
+def strip_html(fragment):
+    """Reduce an HTML cell (badges, spans) to its plain text."""
+    if not fragment:
+        return ""
+    text = str(fragment)
+    if "<" in text:
+        text = _TAG_RE.sub(" ", text)
+    if "&" in text:
+        text = html.unescape(text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def parse_listing_date(value):
+    """Parse a date from a listing cell or user input, returning a date or None."""
+    text = strip_html(value)
+    match = _DATE_RE.search(text)
+    if not match:
+        named = _NAMED_DATE_RE.search(text)
+        month = _MONTHS.get(named.group(2)[:3].lower()) if named else None
+        if not month:
+            return None
+        try:
+            return date(int(named.group(3)), month, int(named.group(1)))
+        except ValueError:
+            return None
+    first, month, last = match.groups()
+    # Day-first is what the E-Paket listing shows, ISO (year-first) is accepted for user input
+    if len(first) == 4:
+        year, day = first, last
+    elif len(last) == 4:
+        year, day = last, first
+    else:
+        return None
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def split_values(text):
+    """Split a comma, semicolon or whitespace separated list into clean values."""
+    if not text:
+        return []
+    return [value for value in re.split(r'[\s,;]+', text) if value]
+
+
+class PackageFilter:
+    """Decide which parsed packages are worth scanning.
+
+    Every criterion is optional; a package has to satisfy all criteria that
+    are set. Packages whose date cannot be parsed are kept when a date range
+    is set, so a format change on the server never silently drops work.
+    """
+
+    def __init__(self, date_from=None, date_to=None, statuses=None, identifiers=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.statuses = {s.strip().lower() for s in statuses or [] if s.strip()}
+        # NIKs, package numbers (PET-...) or encoded package codes
+        self.identifiers = {i.strip() for i in identifiers or [] if i.strip()}
+
+    @classmethod
+    def from_text(cls, date_from="", date_to="", statuses="", identifiers=""):
+        """Build a filter from free-text inputs (GUI fields, command line)."""
+        start = parse_listing_date(date_from) if date_from.strip() else None
+        end = parse_listing_date(date_to) if date_to.strip() else None
+        if date_from.strip() and start is None:
+            raise ValueError(f"Invalid date: {date_from}")
+        if date_to.strip() and end is None:
+            raise ValueError(f"Invalid date: {date_to}")
+        return cls(start, end, [s for s in statuses.split(",")], split_values(identifiers))
+
+    def is_active(self):
+        """Check if any criterion is set."""
+        return bool(self.date_from or self.date_to or self.statuses or self.identifiers)
+
+    def matches(self, package):
+        """Check a parsed package against all criteria."""
+        if self.identifiers and not (
+            package.get("nik") in self.identifiers
+            or package.get("nomor") in self.identifiers
+            or package.get("kode_paket") in self.identifiers
+        ):
+            return False
+
+        if self.statuses and (package.get("status") or "").lower() not in self.statuses:
+            return False
+
+        tanggal = package.get("tanggal")
+        if tanggal is not None:
+            if self.date_from and tanggal < self.date_from:
+                return False
+            if self.date_to and tanggal > self.date_to:
+                return False
+
+        return True
+
+    def describe(self):
+        """Short human readable summary for the status log."""
+        parts = []
+        if self.date_from or self.date_to:
+            start = self.date_from.strftime("%d-%m-%Y") if self.date_from else "..."
+            end = self.date_to.strftime("%d-%m-%Y") if self.date_to else "..."
+            parts.append(f"date {start} to {end}")
+        if self.statuses:
+            parts.append(f"status in {', '.join(sorted(self.statuses))}")
+        if self.identifiers:
+            parts.append(f"{len(self.identifiers)} NIK/package numbers")
+        return "; ".join(parts) if parts else "none"
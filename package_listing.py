@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Streaming decoder and compact records for the package listing.
+The data_pengajuan_ajax listing can hold six-figure row counts, so rows are decoded
+one at a time from the response stream and turned into slotted PackageRecords right
+away; the raw row lists never accumulate in memory.
+"""
+
+import re
+import json
+import codecs
+import functools
+
+from package_filter import strip_html, parse_listing_date
+
+# Extract package code and number from the link HTML
+_LINK_RE = re.compile(r'href="pengajuan/lihat_paket/([^"]+)"[^>]*>([^<]+)</a>')
+_WHITESPACE = " \t\r\n"
+
+# Status badges and dates repeat across rows: caching parses them once and lets
+# every record share the same str/date objects
+_status_text = functools.lru_cache(maxsize=1024)(strip_html)
+_listing_date = functools.lru_cache(maxsize=8192)(parse_listing_date)
+
+
+class PackageRecord:
+    """One listing row reduced to the fields the downloader uses.
+
+    Supports package['nomor'] / package.get('nik') so records and plan rows
+    (plain dicts) can go through the same code paths.
+    """
+
+    __slots__ = ("kode_paket", "nomor", "nama", "nik", "status", "tanggal")
+
+    def __init__(self, kode_paket, nomor, nama, nik, status=None, tanggal=None):
+        self.kode_paket = kode_paket
+        self.nomor = nomor
+        self.nama = nama
+        self.nik = nik
+        self.status = status
+        self.tanggal = tanggal
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"PackageRecord({self.nomor!r}, nik={self.nik!r})"
+
+
+def parse_row(row):
+    """Parse a listing row into a PackageRecord, or None if it has no package link.
+
+    Row format: [index, link_html, nik, nama, phone, status_html, date_html]
+    """
+    link_match = _LINK_RE.search(row[1])
+    if not link_match:
+        return None
+    return PackageRecord(
+        link_match.group(1),
+        link_match.group(2),
+        row[3],
+        row[2],
+        # Used by pre-scan filtering, None when the column is missing
+        _status_text(row[5]) if len(row) > 5 else None,
+        _listing_date(row[6]) if len(row) > 6 else None,
+    )
+
+
+class _StreamBuffer:
+    """Text buffer over a byte-chunk iterator that JSON values are decoded from."""
+
+    # Drop consumed text once this much has accumulated
+    COMPACT_AT = 1024 * 1024
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Read one more chunk, return False at end of stream."""
+        if self.eof:
+            return False
+        if self.pos >= self.COMPACT_AT:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.text += self._decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+        self.text += self._decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or "" at end of stream."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Unexpected listing format: expected {char!r}, got {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may continue in the next chunk
+            if end == len(self.text) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_listing_rows(chunks):
+    """Yield the rows of the listing's "data" array from an iterator of byte chunks."""
+    buffer = _StreamBuffer(chunks)
+    buffer.expect("{")
+    while True:
+        char = buffer.peek()
+        if char == "}" or char == "":
+            return
+        if char == ",":
+            buffer.pos += 1
+            continue
+
+        key = buffer.value()
+        buffer.expect(":")
+        if key != "data":
+            buffer.value()
+            continue
+
+        buffer.expect("[")
+        while True:
+            char = buffer.peek()
+            if char == "]":
+                buffer.pos += 1
+                break
+            if char == ",":
+                buffer.pos += 1
+                continue
+            if char == "":
+                raise ValueError("Unexpected end of listing")
+            yield buffer.value()
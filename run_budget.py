@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Run budgets and checkpoints for downloading in limited windows.
+A RunBudget bounds a run by wall-clock time, bytes downloaded or requests sent; once it
+is used up no new package is started and the ones in progress finish. A RunCheckpoint
+records every finished package of a job, so the next run of the same job skips them
+without rescanning and carries on where the previous window ended. A checkpoint older
+than its max age is ignored, so packages done long ago are checked for new documents.
+"""
+
+import os
+import json
+import time
+import threading
+
+CHECKPOINT_NAME = "run_checkpoint.jsonl"
+CHECKPOINT_MAX_AGE = 7 * 24 * 3600
+
+
+class RunBudget:
+    """Limits for one run; None means unlimited."""
+
+    def __init__(self, max_seconds=None, max_bytes=None, max_requests=None):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.max_requests = max_requests
+        self.started = None
+
+    def is_active(self):
+        return any(limit is not None for limit in (self.max_seconds, self.max_bytes, self.max_requests))
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def exhausted(self, bytes_done, requests):
+        """Reason the budget is used up, or None."""
+        if self.max_seconds is not None and time.monotonic() - self.started >= self.max_seconds:
+            return f"time limit of {self.max_seconds / 60:.0f} min"
+        if self.max_bytes is not None and bytes_done >= self.max_bytes:
+            return f"download limit of {self.max_bytes / (1024 * 1024):.0f} MB"
+        if self.max_requests is not None and requests >= self.max_requests:
+            return f"request limit of {self.max_requests}"
+        return None
+
+    def describe(self):
+        parts = []
+        if self.max_seconds is not None:
+            parts.append(f"{self.max_seconds / 60:.0f} min")
+        if self.max_bytes is not None:
+            parts.append(f"{self.max_bytes / (1024 * 1024):.0f} MB")
+        if self.max_requests is not None:
+            parts.append(f"{self.max_requests} requests")
+        return ", ".join(parts) or "unlimited"
+
+
+class RunCheckpoint:
+    """Append-only list of finished work items (package codes or plan URLs) of one job.
+
+    The first line identifies the job and when it started; a checkpoint written
+    for another job (other document types, filter or shard) or more than max_age
+    seconds ago is ignored and replaced.
+    """
+
+    def __init__(self, path, job, max_age=CHECKPOINT_MAX_AGE):
+        self.path = path
+        self.job = job
+        # Seconds a checkpoint stays usable (None = forever)
+        self.max_age = max_age
+        self.done = set()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the items finished by earlier runs of this job."""
+        if not os.path.exists(self.path):
+            return self.done
+        with open(self.path, 'r', encoding='utf-8') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return self.done
+            if header.get("job") != self.job:
+                return self.done
+            created = header.get("created")
+            if self.max_age is not None and (created is None or time.time() - created > self.max_age):
+                return self.done
+            for line in f:
+                line = line.rstrip("\n")
+                # A crash can leave a half-written last line; it is simply redone
+                if line.startswith('"') and line.endswith('"'):
+                    self.done.add(json.loads(line))
+        return self.done
+
+    def open(self):
+        """Start recording; continues the file when it belongs to this job."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.done:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(json.dumps({"job": self.job, "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                         "created": time.time()}) + "\n")
+            self._file.flush()
+
+    def mark(self, key):
+        """Record one finished item."""
+        with self._lock:
+            self.done.add(key)
+            self._file.write(json.dumps(key, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self, keep=True):
+        """Stop recording; the file is removed unless a later run should resume from it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not keep and os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Live throughput statistics for a download run.
+A background ticker samples the downloader's counters once per interval and hands a
+small snapshot (rates, ETA, recent history) to a callback, so the cost is one wakeup
+per interval no matter how many packages complete.
+"""
+
+import time
+import threading
+from collections import deque
+
+
+class RunStats:
+    """Rolling rates, smoothed ETA and a short throughput history."""
+
+    def __init__(self, window=10.0, history=60, smoothing=0.3):
+        self.window = window
+        self.smoothing = smoothing
+        self._samples = deque()
+        self.history = deque(maxlen=history)
+        self._smoothed_rate = None
+        self.started = time.monotonic()
+
+    def sample(self, processed, total, bytes_done, errors, in_flight, active):
+        """Add a counter sample and return the current snapshot dict."""
+        now = time.monotonic()
+        self._samples.append((now, processed, bytes_done, errors))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+        first = self._samples[0]
+        span = now - first[0]
+        if span > 0:
+            packages_per_sec = (processed - first[1]) / span
+            bytes_per_sec = (bytes_done - first[2]) / span
+        else:
+            packages_per_sec = bytes_per_sec = 0.0
+        done = processed - first[1]
+        error_rate = (errors - first[3]) / done if done > 0 else 0.0
+
+        # Exponential smoothing keeps the ETA from jumping with every slow package
+        if self._smoothed_rate is None:
+            self._smoothed_rate = packages_per_sec
+        else:
+            self._smoothed_rate += self.smoothing * (packages_per_sec - self._smoothed_rate)
+        remaining = max(total - processed, 0)
+        eta = remaining / self._smoothed_rate if self._smoothed_rate > 0 else None
+
+        self.history.append(packages_per_sec)
+        return {
+            "packages_per_sec": packages_per_sec,
+            "mb_per_sec": bytes_per_sec / (1024 * 1024),
+            "in_flight": in_flight,
+            "active_workers": active,
+            "error_rate": error_rate,
+            "eta_seconds": eta,
+            "elapsed": now - self.started,
+            "processed": processed,
+            "total": total,
+            "history": list(self.history),
+        }
+
+
+class StatsTicker:
+    """Calls sample_func() every interval seconds on a daemon thread until stopped."""
+
+    def __init__(self, sample_func, interval=1.0):
+        self.sample_func = sample_func
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StatsTicker", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample_func()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+        # One last sample so the display shows the final state
+        self.sample_func()
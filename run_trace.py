@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-run timeline tracing for the enhanced downloader.
+Records spans per worker thread and writes them in the Chrome trace-event format,
+which opens directly in Perfetto (ui.perfetto.dev) or chrome://tracing.
+"""
+
+import os
+import json
+import time
+import threading
+
+
+class _Span:
+    """Context manager recording one complete ("X") event."""
+
+    __slots__ = ("recorder", "name", "cat", "args", "start")
+
+    def __init__(self, recorder, name, cat, args):
+        self.recorder = recorder
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.complete(self.name, self.start, time.perf_counter_ns(), self.cat, self.args)
+
+
+class TraceRecorder:
+    """Collects trace events from any thread.
+
+    list.append is atomic, so recording needs no lock of its own and cannot
+    distort the contention it is meant to show.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._events = []
+        self._threads = {}
+
+    def now(self):
+        return time.perf_counter_ns()
+
+    def _us(self, ns):
+        return (ns - self._origin) / 1000.0
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+    def span(self, name, cat="package", **args):
+        """Time a block on the current thread."""
+        return _Span(self, name, cat, args)
+
+    def complete(self, name, start_ns, end_ns, cat="package", args=None):
+        """Record a finished span on the current thread."""
+        self._events.append({
+            "name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": self._tid(),
+            "ts": self._us(start_ns), "dur": (end_ns - start_ns) / 1000.0, "args": args or {}
+        })
+
+    def async_span(self, name, key, start_ns, end_ns, cat="queue"):
+        """Record a span that is not tied to a thread (e.g. time spent queued)."""
+        base = {"name": name, "cat": cat, "id": str(key), "pid": self.pid, "tid": self.pid}
+        self._events.append(dict(base, ph="b", ts=self._us(start_ns)))
+        self._events.append(dict(base, ph="e", ts=self._us(end_ns)))
+
+    def instant(self, name, cat="run", **args):
+        """Record a point in time (run start, stop requested, ...)."""
+        self._events.append({
+            "name": name, "cat": cat, "ph": "i", "s": "p", "pid": self.pid, "tid": self._tid(),
+            "ts": self._us(time.perf_counter_ns()), "args": args
+        })
+
+    def save(self, path):
+        """Write the trace as Chrome trace-event JSON."""
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._threads.items())
+        ]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "EnhancedDownloader"}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + list(self._events), "displayTimeUnit": "ms"}, f)
+        return len(self._events)
+
+
+class TracedLock:
+    """Lock wrapper that records a span whenever acquiring it has to wait."""
+
+    def __init__(self, recorder, name="_lock"):
+        self._lock = threading.Lock()
+        self._recorder = recorder
+        self._name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter_ns()
+        acquired = self._lock.acquire(True, timeout)
+        self._recorder.complete(f"wait {self._name}", start, time.perf_counter_ns(), "lock")
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of dokumencetak responses.
+The HTML a package scan returns lists every document the package holds, whatever types
+were selected, so keeping it lets a later run with other document types (or a better
+parser) work from the cached scans instead of POSTing for every package again.
+Entries are zlib-compressed in one SQLite file, expire after a TTL and are evicted
+least-recently-used first once the cache grows past its size limit (hits record their
+use time in memory and are written with the next put or on close). A cached scan is
+only used while the listing shows the package with the same status and date.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from datetime import date
+
+from package_listing import PackageRecord
+
+SCAN_CACHE_NAME = "scan_cache.sqlite"
+
+# Pending use times written in one commit once this many hits pile up between puts
+_USED_FLUSH = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    kode_paket TEXT PRIMARY KEY,
+    package TEXT NOT NULL,
+    html BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL
+)
+"""
+
+
+def _listing_fields(package):
+    """Status and ISO date of a package, as stored with its scan."""
+    tanggal = package.get("tanggal")
+    if isinstance(tanggal, date):
+        tanggal = tanggal.isoformat()
+    return package.get("status"), tanggal
+
+
+class ScanCache:
+    """Compressed, size-bounded cache of scan HTML keyed by kode_paket."""
+
+    def __init__(self, path=SCAN_CACHE_NAME, max_bytes=512 * 1024 * 1024, ttl=30 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        # Seconds a scan stays valid (None = forever)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # kode_paket -> last hit time, not yet written to the database
+        self._used = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS scans_used ON scans (used)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM scans").fetchone()[0]
+
+    def _expired(self, stored, now):
+        return self.ttl is not None and now - stored > self.ttl
+
+    def get(self, package):
+        """Cached scan HTML of a package, or None.
+
+        A scan stored while the package had another status or date is stale:
+        the package may hold new documents since.
+        """
+        kode_paket = package["kode_paket"]
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT html, stored, size, package FROM scans WHERE kode_paket = ?",
+                                   (kode_paket,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self._expired(row[1], now) or _listing_fields(json.loads(row[3])) != _listing_fields(package):
+                self._db.execute("DELETE FROM scans WHERE kode_paket = ?", (kode_paket,))
+                self._db.commit()
+                self._used.pop(kode_paket, None)
+                self._bytes -= row[2]
+                self.misses += 1
+                return None
+            self._used[kode_paket] = now
+            if len(self._used) >= _USED_FLUSH:
+                self._flush_used()
+                self._db.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, package, html):
+        """Store the scan HTML of a package (a PackageRecord or plan/listing dict)."""
+        blob = zlib.compress(html.encode("utf-8"), 6)
+        fields = {key: package.get(key) for key in PackageRecord.__slots__}
+        fields["status"], fields["tanggal"] = _listing_fields(package)
+        now = time.time()
+        with self._lock:
+            self._used.pop(package["kode_paket"], None)
+            self._flush_used()
+            old = self._db.execute("SELECT size FROM scans WHERE kode_paket = ?",
+                                   (package["kode_paket"],)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO scans VALUES (?, ?, ?, ?, ?, ?)",
+                             (package["kode_paket"], json.dumps(fields, ensure_ascii=False), blob, len(blob), now, now))
+            self._bytes += len(blob) - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _flush_used(self):
+        """Write the pending hit times into the current transaction (lock held)."""
+        if self._used:
+            self._db.executemany("UPDATE scans SET used = ? WHERE kode_paket = ?",
+                                 [(used, kode_paket) for kode_paket, used in self._used.items()])
+            self._used.clear()
+
+    def _evict(self):
+        """Drop least recently used scans until the cache is at 90% of its limit."""
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT kode_paket, size FROM scans ORDER BY used").fetchall()
+        doomed = []
+        for kode_paket, size in rows:
+            if self._bytes <= target:
+                break
+            doomed.append((kode_paket,))
+            self._bytes -= size
+        self._db.executemany("DELETE FROM scans WHERE kode_paket = ?", doomed)
+
+    def packages(self):
+        """PackageRecords of all valid cached scans, for runs that work from the cache only."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute("SELECT package, stored FROM scans ORDER BY kode_paket").fetchall()
+        for package, stored in rows:
+            if self._expired(stored, now):
+                continue
+            fields = json.loads(package)
+            if fields.get("tanggal"):
+                fields["tanggal"] = date.fromisoformat(fields["tanggal"])
+            yield PackageRecord(**fields)
+
+    def stats(self):
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+        return {"entries": count, "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._flush_used()
+            self._db.commit()
+            self._db.close()
@@ -4,20 +4,47 @@ Session validation utility for E-Paket system.
 Validates if the provided session cookie is working.
 """
 
-import requests
 import re
 
+from transport import create_transport, default_headers, ConnectionFailed, RequestTimedOut
+
+# Markers of the E-Paket login page that is served instead of data once the session is gone
+_LOGIN_FORM_RE = re.compile(r'<form[^>]*login|type=["\']?password', re.IGNORECASE)
+
+
+class SessionExpired(Exception):
+    """The session cookie stopped working and no new one was provided."""
+
+
+def session_lost(response, body=None, expect_document=False):
+    """Check if a response shows that the session is no longer logged in.
+    
+    Signs are HTTP 401, a redirect that ended on the login page, a login form in
+    body, or an HTML page where a document (PDF or the JSON listing) was
+    expected. 403 is left to the caller: it means a permission problem, not an
+    expired session.
+    """
+    if response.status_code == 401:
+        return True
+    if response.history and "login" in response.url.lower():
+        return True
+    if "text/html" in response.headers.get("Content-Type", "").lower() and expect_document:
+        return True
+    return body is not None and bool(_LOGIN_FORM_RE.search(body[:8192]))
+
+
+def login_page_chunk(chunk):
+    """Check if the first bytes of a streamed body are the login page."""
+    return bool(_LOGIN_FORM_RE.search(chunk[:8192].decode("utf-8", "replace")))
+
+
 class SessionValidator:
-    def __init__(self, base_url="http://real-base-url-is.hidden"): # Contact the developer for the real base url
+    def __init__(self, base_url="http://real-base-url-is.hidden", transport="http1"): # Contact the developer for the real base url
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "en-US,en;q=0.5",
-            "X-Requested-With": "XMLHttpRequest",
-            "Referer": f"{base_url}/pengajuan"
-        })
+        # HTTP transport: "http1", "http2", "auto" or a ready transport instance
+        if isinstance(transport, str):
+            transport = create_transport(transport, headers=default_headers(base_url), pool_size=1)
+        self.transport = transport
     
     def validate_session(self, session_cookie):
         """Validate the session cookie by testing API connectivity."""
@@ -26,10 +53,10 @@ class SessionValidator:
             if "ci_session=" not in session_cookie:
                 session_cookie = f"ci_session={session_cookie}"
             
-            self.session.headers["Cookie"] = session_cookie
+            self.transport.headers["Cookie"] = session_cookie
             
             # Test the API endpoint
-            response = self.session.get(f"{self.base_url}/pengajuan/data_pengajuan_ajax")
+            response = self.transport.request("GET", f"{self.base_url}/pengajuan/data_pengajuan_ajax")
             
             if response.status_code == 200:
                 try:
@@ -47,9 +74,9 @@ class SessionValidator:
             else:
                 return False, f"✗ HTTP {response.status_code} - Server error"
                 
-        except requests.exceptions.ConnectionError:
+        except ConnectionFailed:
             return False, "✗ Connection failed - Check network/server"
-        except requests.exceptions.Timeout:
+        except RequestTimedOut:
             return False, "✗ Timeout - Server not responding"
         except Exception as e:
             return False, f"✗ Error: {str(e)}"
@@ -60,10 +87,10 @@ class SessionValidator:
             if "ci_session=" not in session_cookie:
                 session_cookie = f"ci_session={session_cookie}"
             
-            self.session.headers["Cookie"] = session_cookie
+            self.transport.headers["Cookie"] = session_cookie
             
             # First get packages
-            response = self.session.get(f"{self.base_url}/pengajuan/data_pengajuan_ajax")
+            response = self.transport.request("GET", f"{self.base_url}/pengajuan/data_pengajuan_ajax")
             if response.status_code != 200:
                 return False, "Cannot fetch packages"
             
@@ -87,7 +114,8 @@ class SessionValidator:
             nama = test_package[3]
             
             # Test document API
-            response = self.session.post(
+            response = self.transport.request(
+                "POST",
                 f"{self.base_url}/pengajuan/dokumencetak",
                 data={
                     "kode_paket": kode_paket_encoded,
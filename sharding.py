@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Deterministic work sharding for running one backfill on several processes or hosts.
+Each package belongs to exactly one of N shards by a stable hash of its kode_paket,
+so every shard can read the same listing and take a disjoint slice of it. Shard runs
+write their own manifest and summary; merge_shards combines them into one run report.
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+
+from integrity import MANIFEST_NAME, load_manifests
+
+REPORT_NAME = "run_report.json"
+
+
+def shard_of(key, count):
+    """Shard number (0-based) of a key. Stable across processes, hosts and Python versions."""
+    digest = hashlib.sha1(str(key).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+class Shard:
+    """Shard `index` of `count` (1-based, as written on the command line: 1/4 .. 4/4)."""
+
+    def __init__(self, index, count):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}: expected 1 <= i <= N")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, text):
+        """Parse "i/N", e.g. "2/4"."""
+        try:
+            index, count = (int(part) for part in text.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard: {text!r} (expected i/N, e.g. 1/4)") from None
+        return cls(index, count)
+
+    def contains(self, package):
+        return shard_of(package["kode_paket"], self.count) == self.index - 1
+
+    @property
+    def label(self):
+        return f"shard-{self.index}-of-{self.count}"
+
+    @property
+    def manifest_name(self):
+        return f"download_manifest.{self.label}.jsonl"
+
+    @property
+    def summary_name(self):
+        return f"run_summary.{self.label}.json"
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+class RequestBudget:
+    """Token bucket limiting requests per second across all worker threads.
+
+    A shard takes rate / N of the overall budget so N shards together stay
+    within it, or another share of it when the shards run on uneven hosts.
+    The shares are not coordinated: together they should add up to 1.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_shard(cls, total_rate, shard=None, share=None):
+        """Budget for one shard: share (0..1] of total_rate, by default 1/N."""
+        if not total_rate:
+            return None
+        if share is None:
+            share = 1 / shard.count if shard else 1.0
+        if not 0 < share <= 1:
+            raise ValueError(f"Invalid rate share: {share} (expected 0 < share <= 1)")
+        return cls(total_rate * share)
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def write_shard_summary(root, shard, summary):
+    """Store a shard's result next to its manifest for merge_shards."""
+    path = os.path.join(root, shard.summary_name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, shard=str(shard), finished=time.strftime("%Y-%m-%d %H:%M:%S")), f, indent=2)
+    return path
+
+
+def merge_shards(roots, output_dir):
+    """Combine shard manifests and summaries from the given folders.
+
+    Writes the merged manifest (latest entry per location) to output_dir and
+    returns the combined report, which is also written to output_dir/run_report.json.
+    Manifest locations stay relative, so they are valid once the shards' files
+    are copied into one tree.
+    """
+    entries = {}
+    summaries = []
+    for root in roots:
+        for key, entry in load_manifests(root).items():
+            if key not in entries or entry.get("saved", "") >= entries[key].get("saved", ""):
+                entries[key] = entry
+        for path in sorted(glob.glob(os.path.join(root, "run_summary.shard-*.json"))):
+            with open(path, 'r', encoding='utf-8') as f:
+                summaries.append(json.load(f))
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        for entry in sorted(entries.values(), key=lambda e: e["location"]):
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    report = {"shards": summaries, "documents": len(entries), "missing_shards": []}
+    for key in ("downloaded", "skipped", "errors", "total_packages"):
+        report[key] = sum(summary.get(key, 0) for summary in summaries)
+
+    # Every shard of the same split must be present for the report to be complete
+    counts = {int(summary["shard"].split("/")[1]) for summary in summaries}
+    if len(counts) > 1:
+        report["error"] = f"Summaries from different splits: {sorted(counts)}"
+    elif counts:
+        count = counts.pop()
+        seen = {int(summary["shard"].split("/")[0]) for summary in summaries}
+        report["missing_shards"] = [f"{i}/{count}" for i in range(1, count + 1) if i not in seen]
+    report["success"] = (bool(summaries) and "error" not in report and not report["missing_shards"]
+                         and all(summary.get("success") for summary in summaries))
+
+    with open(os.path.join(output_dir, REPORT_NAME), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+HTTP transports for talking to the E-Paket server.
+RequestsTransport uses HTTP/1.1 via requests (one connection per concurrent worker).
+HTTPXTransport multiplexes requests over a few HTTP/2 connections via httpx when the
+server supports it and falls back to HTTP/1.1 when it doesn't.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def default_headers(base_url):
+    """Browser-like headers the E-Paket AJAX endpoints expect."""
+    return {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:146.0) Gecko/20100101 Firefox/146.0",
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "Accept-Language": "en-US,en;q=0.5",
+        "X-Requested-With": "XMLHttpRequest",
+        "Referer": f"{base_url}/pengajuan"
+    }
+
+
+class TransportError(Exception):
+    """Base class for transport level failures."""
+
+
+class ConnectionFailed(TransportError):
+    """The server could not be reached."""
+
+
+class RequestTimedOut(TransportError):
+    """The server did not answer in time."""
+
+
+class TransportResponse:
+    """Small common view over requests and httpx responses."""
+
+    def __init__(self, response, iter_bytes, http_version, url, history):
+        self._response = response
+        self._iter_bytes = iter_bytes
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.http_version = http_version
+        self.url = url
+        # Number of redirects followed to get here
+        self.history = history
+
+    @property
+    def text(self):
+        return self._response.text
+
+    @property
+    def content(self):
+        return self._response.content
+
+    def json(self):
+        return self._response.json()
+
+    def iter_bytes(self, chunk_size=8192):
+        return self._iter_bytes(chunk_size)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RequestsTransport:
+    """HTTP/1.1 transport built on a pooled requests.Session."""
+
+    name = "http/1.1"
+
+    def __init__(self, headers=None, pool_size=10):
+        self.session = requests.Session()
+        # Keep one pooled connection per worker instead of requests' default of 10
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    def request(self, method, url, data=None, stream=False, timeout=None, allow_redirects=True):
+        """Send a request and return a TransportResponse."""
+        try:
+            response = self.session.request(method, url, data=data, stream=stream,
+                                            timeout=timeout, allow_redirects=allow_redirects)
+        except requests.exceptions.Timeout as e:
+            raise RequestTimedOut(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionFailed(str(e)) from e
+
+        version = getattr(response.raw, "version", 11)
+        return TransportResponse(
+            response,
+            lambda chunk_size: response.iter_content(chunk_size=chunk_size),
+            "HTTP/1.0" if version == 10 else "HTTP/1.1",
+            response.url,
+            len(response.history),
+        )
+
+    def reset(self):
+        """Drop pooled connections; the next requests open fresh ones."""
+        for adapter in self.session.adapters.values():
+            adapter.close()
+
+    def close(self):
+        self.session.close()
+
+
+class HTTPXTransport:
+    """HTTP/2 transport built on httpx (optional dependency: pip install "httpx[http2]").
+
+    Over https the protocol is negotiated with ALPN, so servers without HTTP/2
+    simply get HTTP/1.1. Over plain http HTTP/2 needs prior knowledge; with
+    prior_knowledge=True the first protocol error drops the client back to
+    HTTP/1.1 for the rest of the run. A first response that is not HTTP/2 does
+    the same, so HTTP/1.1 gets one connection per worker instead of the few
+    meant for multiplexing.
+    """
+
+    name = "http/2"
+
+    def __init__(self, headers=None, pool_size=10, max_connections=4, prior_knowledge=False):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError('HTTP/2 transport needs httpx: pip install "httpx[http2]"') from e
+        self._httpx = httpx
+        self._headers = dict(headers or {})
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.prior_knowledge = prior_knowledge
+        self.fell_back = False
+        self._http2_seen = False
+        self._fallback_lock = threading.Lock()
+        # Clients replaced by the fallback; other workers may still be reading from them
+        self._retired = []
+        self.client = self._build_client(http2=True)
+
+    def _build_client(self, http2):
+        httpx = self._httpx
+        if http2:
+            # Streams are multiplexed, so a handful of connections serve every worker
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+        else:
+            limits = httpx.Limits(max_connections=self.pool_size,
+                                  max_keepalive_connections=self.pool_size)
+        return httpx.Client(
+            http1=not (http2 and self.prior_knowledge),
+            http2=http2,
+            limits=limits,
+            headers=self._headers,
+            timeout=None,
+        )
+
+    @property
+    def headers(self):
+        return self.client.headers
+
+    def _fall_back(self):
+        """Rebuild the client as plain HTTP/1.1, keeping current headers."""
+        with self._fallback_lock:
+            if self.fell_back:
+                return
+            self._headers = dict(self.client.headers)
+            self._retired.append(self.client)
+            self.client = self._build_client(http2=False)
+            self.fell_back = True
+            self.name = "http/1.1 (fallback)"
+
+    def _close_retired(self):
+        for client in self._retired:
+            client.close()
+        self._retired = []
+
+    def request(self, method, url, data=None, stream=False, timeout=None, allow_redirects=True):
+        """Send a request and return a TransportResponse."""
+        httpx = self._httpx
+        try:
+            try:
+                response = self._send(method, url, data, stream, timeout, allow_redirects)
+            except httpx.RemoteProtocolError:
+                # Only a server that never answered over HTTP/2 counts as not supporting it
+                if self.fell_back or not self.prior_knowledge or self._http2_seen:
+                    raise
+                self._fall_back()
+                response = self._send(method, url, data, stream, timeout, allow_redirects)
+        except httpx.TimeoutException as e:
+            raise RequestTimedOut(str(e)) from e
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError) as e:
+            raise ConnectionFailed(str(e)) from e
+
+        if response.http_version == "HTTP/2":
+            self._http2_seen = True
+        elif not self._http2_seen and not self.fell_back:
+            # The server speaks HTTP/1.1 only: four connections would hold back the workers
+            self._fall_back()
+        return TransportResponse(
+            response,
+            lambda chunk_size: response.iter_bytes(chunk_size=chunk_size),
+            response.http_version,
+            str(response.url),
+            len(response.history),
+        )
+
+    def _send(self, method, url, data, stream, timeout, allow_redirects):
+        request = self.client.build_request(method, url, data=data,
+                                            timeout=timeout if timeout is not None else self._httpx.USE_CLIENT_DEFAULT)
+        return self.client.send(request, stream=stream, follow_redirects=allow_redirects)
+
+    def reset(self):
+        """Replace the client, so the next requests open fresh connections."""
+        self._headers = dict(self.client.headers)
+        self.client.close()
+        self._close_retired()
+        self.client = self._build_client(http2=not self.fell_back)
+
+    def close(self):
+        self.client.close()
+        self._close_retired()
+
+
+def http2_available():
+    """Check if the optional HTTP/2 stack is installed."""
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_transport(kind="http1", headers=None, pool_size=10, prior_knowledge=False):
+    """Build a transport by name: "http1", "http2" or "auto" (http2 if installed)."""
+    if kind == "auto":
+        kind = "http2" if http2_available() else "http1"
+    if kind == "http2":
+        return HTTPXTransport(headers=headers, pool_size=pool_size, prior_knowledge=prior_knowledge)
+    if kind == "http1":
+        return RequestsTransport(headers=headers, pool_size=pool_size)
+    raise ValueError(f"Unknown transport: {kind}")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Watch mode: one warm engine polling for new submissions.
+A Watcher keeps a single EnhancedDownloader (pooled connections, session cookie,
+content index, parse pool) alive and polls the package listing. Only packages that are
+new, or whose status or date changed since they were last handled, are scanned. The
+poll interval snaps to its minimum when new work appears and backs off while the
+listing stays unchanged, so an idle watcher costs one listing request per interval.
+"""
+
+import os
+import json
+import time
+import zlib
+import threading
+
+WATCH_STATE_NAME = "watch_state.json"
+
+
+def package_fingerprint(package):
+    """Small number that changes when a package's status or date changes."""
+    return zlib.crc32(f"{package.get('status')}|{package.get('tanggal')}".encode("utf-8"))
+
+
+class AdaptiveInterval:
+    """Seconds between polls: min_seconds while there is activity, backing off to max_seconds."""
+
+    def __init__(self, min_seconds=5.0, max_seconds=120.0, backoff=1.5):
+        if not 0 < min_seconds <= max_seconds:
+            raise ValueError(f"Invalid poll interval: {min_seconds}..{max_seconds}s")
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.backoff = backoff
+        self.current = min_seconds
+
+    def update(self, new_packages):
+        """Next wait after a poll that found new_packages new or changed packages."""
+        if new_packages:
+            self.current = self.min_seconds
+        else:
+            self.current = min(self.max_seconds, self.current * self.backoff)
+        return self.current
+
+
+class Watcher:
+    """Poll and download new documents until stopped.
+
+    The fingerprints of handled packages are kept in state_path (default
+    watch_state.json in the output folder), so a restarted watcher only scans
+    what changed while it was down. State written for other document types or
+    another filter is ignored, since those packages were never scanned for this watch.
+    """
+
+    def __init__(self, downloader, document_types, session_cookie, package_filter=None, interval=None,
+                 state_path=None, max_polls=None):
+        if downloader.scan_mode == "cache-only":
+            raise ValueError("Watch mode needs the live listing, not scan mode cache-only")
+        self.downloader = downloader
+        self.document_types = document_types
+        self.session_cookie = session_cookie
+        self.package_filter = package_filter
+        self.interval = interval if interval is not None else AdaptiveInterval()
+        if state_path is None:
+            shard = downloader.shard
+            name = f"watch_state.{shard.label}.json" if shard else WATCH_STATE_NAME
+            state_path = os.path.join(downloader.output.root, name)
+        self.state_path = state_path
+        self.max_polls = max_polls
+        filter_text = package_filter.describe() if package_filter is not None and package_filter.is_active() else ""
+        self.job = [sorted(document_types), filter_text]
+        self.known = {}
+        self.failed = {}
+        self.polls = 0
+        self._saved = 0.0
+        self._stop = threading.Event()
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except ValueError:
+            self.downloader.update_status(f"Ignoring unreadable watch state {self.state_path}", "warning")
+            return
+        if state.get("job") != self.job:
+            self.downloader.update_status(f"Watch state {self.state_path} is for other document types or "
+                                          "another filter; starting over", "warning")
+            return
+        self.known = state.get("known", {})
+        self.failed = state.get("failed", {})
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(self.state_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"job": self.job, "known": self.known, "failed": self.failed, "saved": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+        self._saved = time.monotonic()
+
+    def stop(self):
+        """Stop after the current poll (which is itself stopped)."""
+        self._stop.set()
+        self.downloader.stop_download()
+
+    def run(self):
+        """Poll until stopped, max_polls is reached or the session expires; returns the totals."""
+        downloader = self.downloader
+        self.load_state()
+        if self.known:
+            downloader.update_status(f"Watch state {self.state_path}: {len(self.known)} packages already handled")
+        totals = {"success": True, "polls": 0, "downloaded": 0, "skipped": 0, "errors": 0, "total_packages": 0}
+        downloader.keep_warm = True
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                result = downloader.download_changed(self.document_types, self.session_cookie, self.known,
+                                                     self.failed, self.package_filter)
+                self.polls += 1
+                totals["polls"] = self.polls
+                # A cookie renewed during the poll must not be replaced by the old one next time
+                if downloader.session_cookie:
+                    self.session_cookie = downloader.session_cookie
+                for key in ("downloaded", "skipped", "errors"):
+                    totals[key] += result.get(key, 0)
+                totals["total_packages"] += result.get("changed", 0)
+                # Busy polls come every few seconds; rewriting the state once in a while is enough
+                if result.get("changed") and time.monotonic() - self._saved >= 30:
+                    self.save_state()
+
+                if result.get("session_expired"):
+                    totals.update(success=False, error="Session expired", session_expired=True)
+                    break
+                if not result["success"]:
+                    # Listing unavailable: keep backing off and try again
+                    downloader.update_status(f"Poll failed: {result.get('error')}", "warning")
+                if self.max_polls is not None and self.polls >= self.max_polls:
+                    break
+
+                wait = self.interval.update(result.get("new", 0))
+                # The interval runs from the start of a poll, so long polls do not stretch it
+                wait = max(0.0, wait - (time.monotonic() - started))
+                downloader.update_status(f"Next poll in {wait:.0f}s (interval {self.interval.current:.0f}s)")
+                self._stop.wait(wait)
+        finally:
+            downloader.keep_warm = False
+            if self.polls:
+                self.save_state()
+            downloader.close()
+        if self._stop.is_set():
+            downloader.update_status(f"Watch stopped after {self.polls} polls", "warning")
+        return totals